@@ -0,0 +1,383 @@
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import parse_qs, urlsplit
+
+from benchmarks.run import load_fixture
+
+# локальная замена вк для прогона скриптов целиком, без аккаунта и browserstack:
+#
+#   python -m benchmarks.replay --port 8800 --latency 0.2 --flood-rate 0.05
+#   VK_BASE_URL=http://127.0.0.1:8800 DRIVER_BACKEND=local GROUPS=1,2,3 \
+#       VK_OTP=JBSWY3DPEHPK3PXP python scripts/stories.py
+#
+# страницы берутся из benchmarks/fixtures, действия (отмена исключения,
+# удаление истории, сохранение настроек) только считаются, состояние
+# страниц между запросами не меняется. счетчики отдаются по /replay/stats
+
+SESSION_COOKIE = "remixsid"
+
+CLUB_PATTERN = re.compile(r"^/club(\d+)$")
+PROFILE_PATTERN = re.compile(r"^/id(\d+)$")
+
+PROFILES = ["verified", "esia", "plain", "deleted"]
+
+ACTIONS = {"kick_cancel", "story_delete", "save_settings"}
+
+FLOOD_PAGE = """<!DOCTYPE html>
+<html lang="en">
+<head><meta charset="utf-8"><title>Flood control</title></head>
+<body>
+<div class="service_msg_null">Flood control. You have tried to open several similar pages too fast. Please try again later.</div>
+</body>
+</html>
+"""
+
+EMPTY_EVENT_LOG_PAGE = """<!DOCTYPE html>
+<html lang="en">
+<head><meta charset="utf-8"><title>Event log</title></head>
+<body>
+<div id="page_body"><div class="groups_edit_event_log"></div></div>
+</body>
+</html>
+"""
+
+# ведет себя как обработчики вк: действия уходят запросом на сервер,
+# а измененные элементы заменяются, поэтому старые ссылки на них протухают
+REPLAY_SCRIPT = """<script>
+function replayAction(type) {
+    return fetch("/replay/action", {
+        method: "POST",
+        body: JSON.stringify({type: type, page: location.pathname + location.search}),
+    }).then((response) => {
+        if (response.status === 429) {
+            const box = document.createElement("div");
+            box.className = "replay_flood";
+            box.textContent = "Flood control";
+            document.body.appendChild(box);
+            throw new Error("flood control");
+        }
+    });
+}
+
+let pendingStory = null;
+
+document.addEventListener("click", (event) => {
+    const target = event.target;
+
+    const toggle = target.closest("a.groups_edit_event_log_item_wrap_toggle");
+    if (toggle) {
+        event.preventDefault();
+        toggle.closest(".groups_edit_event_log_item_wrap").classList.toggle("unwrapped");
+        return;
+    }
+
+    const kick = target.closest("a.groups_edit_event_log_item_action_link");
+    if (kick) {
+        event.preventDefault();
+        replayAction("kick_cancel").then(() => {
+            const done = document.createElement("div");
+            done.className = "groups_edit_event_log_item_cancelled";
+            done.textContent = "Action cancelled";
+            kick.replaceWith(done);
+        }, () => {});
+        return;
+    }
+
+    const deleteButton = target.closest(".story_stats_row_deleteButton");
+    if (deleteButton) {
+        pendingStory = deleteButton.closest(".story_stats_row");
+        const box = document.createElement("div");
+        box.className = "box_layout";
+        box.innerHTML = '<button class="FlatButton FlatButton--primary">Delete</button>';
+        document.body.appendChild(box);
+        return;
+    }
+
+    const confirmButton = target.closest(".box_layout button.FlatButton--primary");
+    if (confirmButton) {
+        const box = confirmButton.closest(".box_layout");
+        replayAction("story_delete").then(() => {
+            if (pendingStory) {
+                pendingStory.remove();
+            }
+        }, () => {}).finally(() => box.remove());
+        return;
+    }
+
+    const popupItem = target.closest(".idd_popup .idd_item");
+    if (popupItem) {
+        const value = document.querySelector(".idd_selected_value");
+        if (value) {
+            value.textContent = popupItem.innerText.trim();
+        }
+        return;
+    }
+
+    const saveButton = target.closest("button.group_save_button");
+    if (saveButton && saveButton.innerText.trim() === "Save") {
+        replayAction("save_settings").catch(() => {});
+        return;
+    }
+
+    const option = target.closest(".Select__option");
+    if (option) {
+        const placeholder = document.querySelector(".Select__placeholder");
+        if (placeholder) {
+            placeholder.textContent = option.innerText.trim();
+        }
+        replayAction("save_settings").catch(() => {});
+    }
+});
+</script>
+"""
+
+
+INLINE_PAGES = {"flood": FLOOD_PAGE, "event_log_empty": EMPTY_EVENT_LOG_PAGE}
+
+
+@lru_cache(maxsize=None)
+def get_page(name: str) -> str:
+    html = INLINE_PAGES.get(name) or load_fixture(f"{name}.html")
+    return html.replace("</body>", REPLAY_SCRIPT + "</body>")
+
+
+class ReplayStats:
+    def __init__(self):
+        self.pages: dict[str, int] = {}
+        self.actions: dict[str, int] = {}
+        self.floods = 0
+        self.started_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def count_page(self, page: str):
+        with self._lock:
+            self.pages[page] = self.pages.get(page, 0) + 1
+
+    def count_action(self, action: str):
+        with self._lock:
+            self.actions[action] = self.actions.get(action, 0) + 1
+
+    def count_flood(self):
+        with self._lock:
+            self.floods += 1
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                "uptime": round(time.monotonic() - self.started_at, 3),
+                "pages": dict(self.pages),
+                "actions": dict(self.actions),
+                "floods": self.floods,
+            }
+
+
+class ReplayServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    latency: float
+    jitter: float
+    flood_rate: float
+    stats: ReplayStats
+
+    def __init__(
+        self,
+        address: tuple[str, int],
+        latency: float = 0,
+        jitter: float = 0,
+        flood_rate: float = 0,
+        seed: Optional[int] = None,
+    ):
+        super().__init__(address, ReplayHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.flood_rate = flood_rate
+        self.stats = ReplayStats()
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()
+
+    def get_delay(self) -> float:
+        with self._random_lock:
+            jitter = self._random.uniform(-self.jitter, self.jitter)
+
+        return max(0.0, self.latency + jitter)
+
+    def should_flood(self) -> bool:
+        with self._random_lock:
+            return self._random.random() < self.flood_rate
+
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    server: ReplayServer
+
+    def log_message(self, format: str, *args):
+        pass
+
+    @property
+    def logged_in(self) -> bool:
+        return f"{SESSION_COOKIE}=" in self.headers.get("Cookie", "")
+
+    def send_body(self, status: int, body: str, content_type: str = "text/html"):
+        data = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", f"{content_type}; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_page(self, name: str):
+        self.server.stats.count_page(name)
+        self.send_body(200, get_page(name))
+
+    def redirect(self, location: str, cookie: Optional[str] = None):
+        self.send_response(303)
+        self.send_header("Location", location)
+        if cookie:
+            self.send_header("Set-Cookie", cookie)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def get_club_page(self, query: dict[str, list[str]]) -> str:
+        act = query.get("act", [""])[0]
+
+        if act == "event_log":
+            if int(query.get("offset", ["0"])[0]):
+                return "event_log_empty"
+
+            if query.get("action_type", [""])[0] == "users":
+                return "event_log_users"
+
+            return "event_log_wall"
+
+        if act in ["stories", "stories_replies", "site"]:
+            return act
+
+        return "group"
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+
+        if url.path == "/robots.txt":
+            self.send_body(200, "User-agent: *\n", "text/plain")
+            return
+
+        if url.path == "/replay/stats":
+            self.send_body(
+                200, json.dumps(self.server.stats.to_dict()), "application/json"
+            )
+            return
+
+        time.sleep(self.server.get_delay())
+
+        if url.path == "/join":
+            self.send_page("login_phone")
+            return
+
+        if not self.logged_in:
+            self.redirect("/join?vkid_auth_type=sign_in")
+            return
+
+        if url.path == "/feed":
+            self.send_page("feed")
+            return
+
+        club = CLUB_PATTERN.match(url.path)
+        profile = PROFILE_PATTERN.match(url.path)
+        if not club and not profile:
+            self.send_body(404, "not found", "text/plain")
+            return
+
+        if self.server.should_flood():
+            self.server.stats.count_flood()
+            self.send_page("flood")
+        elif club:
+            self.send_page(self.get_club_page(query))
+        else:
+            self.send_page(f"profile_{PROFILES[int(profile.group(1)) % len(PROFILES)]}")
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+        time.sleep(self.server.get_delay())
+
+        if url.path == "/join/otp":
+            self.send_page("login_otp")
+        elif url.path == "/join/password":
+            self.send_page("login_password")
+        elif url.path == "/join/finish":
+            self.redirect("/feed", f"{SESSION_COOKIE}=replay; Path=/")
+        elif url.path == "/replay/action":
+            self.handle_action(body)
+        else:
+            self.send_body(404, "not found", "text/plain")
+
+    def handle_action(self, body: bytes):
+        try:
+            action = json.loads(body).get("type")
+        except (json.JSONDecodeError, AttributeError):
+            action = None
+
+        if not self.logged_in or action not in ACTIONS:
+            self.send_body(400, json.dumps({"error": "bad action"}), "application/json")
+            return
+
+        if self.server.should_flood():
+            self.server.stats.count_flood()
+            self.send_body(
+                429, json.dumps({"error": "flood control"}), "application/json"
+            )
+            return
+
+        self.server.stats.count_action(action)
+        self.send_body(200, json.dumps({"ok": True}), "application/json")
+
+
+def main():
+    arguments = argparse.ArgumentParser(
+        description="локальный сервер записанных страниц вк для прогона скриптов"
+    )
+    arguments.add_argument("--host", default="127.0.0.1")
+    arguments.add_argument("--port", type=int, default=8800)
+    arguments.add_argument(
+        "--latency", type=float, default=0, help="задержка ответа в секундах"
+    )
+    arguments.add_argument(
+        "--jitter", type=float, default=0, help="разброс задержки в секундах"
+    )
+    arguments.add_argument(
+        "--flood-rate",
+        type=float,
+        default=0,
+        help="доля страниц и действий, на которые отвечает flood control",
+    )
+    arguments.add_argument("--seed", type=int, default=None)
+    options = arguments.parse_args()
+
+    server = ReplayServer(
+        (options.host, options.port),
+        options.latency,
+        options.jitter,
+        options.flood_rate,
+        options.seed,
+    )
+    print(f"VK_BASE_URL=http://{options.host}:{server.server_port}")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(json.dumps(server.stats.to_dict(), indent=4))
+
+
+if __name__ == "__main__":
+    main()
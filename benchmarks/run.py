@@ -0,0 +1,301 @@
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+BENCHMARKS_PATH = Path(__file__).parent
+FIXTURES_PATH = BENCHMARKS_PATH / "fixtures"
+BUDGETS_PATH = BENCHMARKS_PATH / "budgets.json"
+
+# замеры без записи в budgets.json выводятся, но не проверяются; бюджеты
+# браузерных замеров записываются прогоном --browser --update-budgets на
+# машине с хромом
+
+# при обновлении бюджетов измеренное время умножается на запас, чтобы шум
+# машины не ронял прогон
+BUDGET_MARGIN = 2.0
+
+
+class Benchmark:
+    name: str
+    fixture: str
+    run: Callable[[Any], Any]
+    browser: bool
+
+    def __init__(
+        self, name: str, fixture: str, run: Callable[[Any], Any], browser: bool = False
+    ):
+        self.name = name
+        self.fixture = fixture
+        self.run = run
+        self.browser = browser
+
+
+class Measurement:
+    benchmark: Benchmark
+    seconds: float
+    items: int
+    budget: Optional[float]
+
+    def __init__(
+        self, benchmark: Benchmark, seconds: float, items: int, budget: Optional[float]
+    ):
+        self.benchmark = benchmark
+        self.seconds = seconds
+        self.items = items
+        self.budget = budget
+
+    @property
+    def milliseconds(self) -> float:
+        return self.seconds * 1000
+
+    @property
+    def over_budget(self) -> bool:
+        return self.budget is not None and self.milliseconds > self.budget
+
+
+def load_fixture(name: str) -> str:
+    return (FIXTURES_PATH / name).read_text(encoding="utf-8")
+
+
+def count_items(result: Any) -> int:
+    if isinstance(result, dict) and "kicks" in result:
+        return len(result["kicks"])
+
+    if isinstance(result, (list, tuple)):
+        return len(result)
+
+    return 1
+
+
+def get_parser_benchmarks() -> list[Benchmark]:
+    from scripts.common import event_log
+
+    def traverse(html: str) -> list:
+        # одна страница журнала, следующая пустая
+        pages = event_log.iter_event_log(
+            lambda url: html if "offset=" not in url else "<html></html>",
+            event_log.EventLogPager("https://vk.com/club1?act=event_log"),
+            1,
+        )
+        return [comment for page in pages for comment in page]
+
+    benchmarks = [
+        Benchmark(
+            "event_log_wall/bs4",
+            "event_log_wall.html",
+            lambda html: event_log.parse_comments(html, 1, backend="bs4"),
+        ),
+    ]
+
+    if event_log.lxml:
+        benchmarks += [
+            Benchmark(
+                "event_log_wall/lxml",
+                "event_log_wall.html",
+                lambda html: event_log.parse_comments(html, 1, backend="lxml"),
+            ),
+            Benchmark("event_log_wall/traversal", "event_log_wall.html", traverse),
+        ]
+
+    return benchmarks
+
+
+def get_browser_benchmarks() -> list[Benchmark]:
+    from scripts import members, stories, stories_replies, verify, vk_link
+    from scripts.common.extract import find_by_text
+
+    benchmarks = [
+        Benchmark(
+            "event_log_users/wraps",
+            "event_log_users.html",
+            members.WRAPS_EXTRACTOR.extract,
+        ),
+        Benchmark(
+            "event_log_users/kicks",
+            "event_log_users.html",
+            members.KICKS_EXTRACTOR.extract,
+        ),
+        Benchmark("stories/rows", "stories.html", stories.STORIES_EXTRACTOR.extract),
+        Benchmark(
+            "stories_replies/value",
+            "stories_replies.html",
+            stories_replies.REPLIES_EXTRACTOR.extract,
+        ),
+        Benchmark(
+            "stories_replies/save_button",
+            "stories_replies.html",
+            lambda driver: find_by_text(
+                driver,
+                stories_replies.SAVE_BUTTON,
+                "Save",
+                stories_replies.SAVE_BUTTON_CHILDREN_CONTENT,
+            ),
+        ),
+        Benchmark(
+            "site/disabled_option",
+            "site.html",
+            lambda driver: find_by_text(driver, vk_link.SELECTABLE, "Disabled"),
+        ),
+    ]
+
+    for profile in ["verified", "esia", "plain", "deleted"]:
+        benchmarks.append(
+            Benchmark(
+                f"profile_{profile}/check_mark",
+                f"profile_{profile}.html",
+                verify.has_check_mark,
+            )
+        )
+
+    for benchmark in benchmarks:
+        benchmark.browser = True
+
+    return benchmarks
+
+
+def check_parser_parity() -> list[str]:
+    # lxml и bs4 должны отдавать одинаковые записи на всех сохраненных страницах
+    from scripts.common import event_log
+
+    if not event_log.lxml:
+        print("lxml не установлен, сверка парсеров пропущена")
+        return []
+
+    def dump(html: str, backend: str) -> tuple:
+        page = event_log.parse_page(html, 1, backend=backend)
+        comments = event_log.parse_comments(html, 1, backend=backend)
+        return (
+            page.items_count,
+            page.first_item,
+            [vars(i) for i in page.comments],
+            [vars(i) for i in comments],
+        )
+
+    mismatches = []
+    for path in sorted(FIXTURES_PATH.glob("*.html")):
+        html = path.read_text(encoding="utf-8")
+        if dump(html, "bs4") != dump(html, "lxml"):
+            mismatches.append(path.name)
+
+    return mismatches
+
+
+def measure(run: Callable[[Any], Any], argument: Any, rounds: int) -> tuple[float, int]:
+    # первый прогон прогревающий, в зачет идет медиана остальных
+    items = count_items(run(argument))
+    timings = []
+
+    for _ in range(rounds):
+        started_at = time.perf_counter()
+        run(argument)
+        timings.append(time.perf_counter() - started_at)
+
+    return statistics.median(timings), items
+
+
+def create_driver():
+    os.environ["DRIVER_BACKEND"] = "local"
+    from scripts.common.driver import create_browser
+
+    return create_browser()
+
+
+def run_benchmarks(
+    benchmarks: list[Benchmark], budgets: dict[str, float], rounds: int
+) -> list[Measurement]:
+    driver = None
+    measurements = []
+
+    try:
+        for benchmark in benchmarks:
+            if benchmark.browser:
+                driver = driver or create_driver()
+                driver.get((FIXTURES_PATH / benchmark.fixture).resolve().as_uri())
+                argument = driver
+            else:
+                argument = load_fixture(benchmark.fixture)
+
+            seconds, items = measure(benchmark.run, argument, rounds)
+            measurements.append(
+                Measurement(benchmark, seconds, items, budgets.get(benchmark.name))
+            )
+    finally:
+        if driver:
+            driver.quit()
+
+    return measurements
+
+
+def print_measurements(measurements: list[Measurement]):
+    print(f"{'benchmark':<32} {'ms':>10} {'budget':>10} {'items/s':>12}")
+
+    for measurement in measurements:
+        budget = f"{measurement.budget:.1f}" if measurement.budget else "-"
+        throughput = (
+            measurement.items / measurement.seconds if measurement.seconds else 0
+        )
+        status = "  FAIL" if measurement.over_budget else ""
+        print(
+            f"{measurement.benchmark.name:<32} {measurement.milliseconds:>10.2f} "
+            f"{budget:>10} {throughput:>12.0f}{status}"
+        )
+
+
+def main() -> int:
+    arguments = argparse.ArgumentParser(
+        description="замер скорости парсеров и экстракторов на сохраненных страницах"
+    )
+    arguments.add_argument(
+        "--browser",
+        action="store_true",
+        help="замерять js-экстракторы в локальном headless хроме",
+    )
+    arguments.add_argument("--rounds", type=int, default=20)
+    arguments.add_argument("--filter", default="", help="подстрока в имени замера")
+    arguments.add_argument(
+        "--update-budgets",
+        action="store_true",
+        help="записать бюджеты по результатам этого прогона",
+    )
+    options = arguments.parse_args()
+
+    mismatches = check_parser_parity()
+    if mismatches:
+        print(f"lxml и bs4 разобрали по-разному: {', '.join(mismatches)}")
+        return 1
+
+    benchmarks = get_parser_benchmarks()
+    if options.browser:
+        benchmarks += get_browser_benchmarks()
+
+    benchmarks = [i for i in benchmarks if options.filter in i.name]
+
+    budgets = json.loads(BUDGETS_PATH.read_text()) if BUDGETS_PATH.exists() else {}
+    measurements = run_benchmarks(benchmarks, budgets, options.rounds)
+    print_measurements(measurements)
+
+    if options.update_budgets:
+        budgets.update(
+            {
+                i.benchmark.name: round(i.milliseconds * BUDGET_MARGIN, 1)
+                for i in measurements
+            }
+        )
+        BUDGETS_PATH.write_text(json.dumps(budgets, indent=4, sort_keys=True) + "\n")
+        return 0
+
+    failed = [i.benchmark.name for i in measurements if i.over_budget]
+    if failed:
+        print(f"превышен бюджет: {', '.join(failed)}")
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,123 @@
+import json
+import socketserver
+import threading
+import time
+from typing import Optional
+
+from helpers.rate_governor import GovernorStore, RateGovernor
+from helpers.scraper_accounts import get_governor_key
+
+
+class FloodCoordinatorHandler(socketserver.StreamRequestHandler):
+    server: "FloodCoordinatorServer"
+
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+
+            response = self.server.coordinator.handle_request(json.loads(line))
+            self.wfile.write((json.dumps(response) + "\n").encode("utf-8"))
+            self.wfile.flush()
+
+
+class FloodCoordinatorServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    coordinator: "FloodCoordinator"
+
+    def __init__(self, coordinator: "FloodCoordinator"):
+        self.coordinator = coordinator
+        super().__init__(("127.0.0.1", 0), FloodCoordinatorHandler)
+
+
+# вк ограничивает аккаунт целиком, поэтому корзина токенов на каждое действие
+# одна на все сессии аккаунта (поле account запроса). перед
+# действием скрипт запрашивает {"op": "acquire"} и ждет выданное время,
+# затем {"op": "hold"}: если за время ожидания какая-то сессия поймала
+# flood control, ждать придется и остальным. итог действия сообщается
+# запросом {"op": "report"} с outcome ok или flood
+class FloodCoordinator:
+    governors: dict[str, RateGovernor]
+    hold_until: dict[str, float]
+    store: GovernorStore
+
+    def __init__(self, path: str = "scripts_results/governor.json"):
+        self.store = GovernorStore(path)
+        self.governors = {}
+        self.hold_until = {}
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    @property
+    def address(self) -> str:
+        host, port = self._server.server_address
+        return f"{host}:{port}"
+
+    def get_governor(self, action: str, account: Optional[str] = None) -> RateGovernor:
+        key = get_governor_key(action, account)
+
+        with self._lock:
+            if key not in self.governors:
+                self.governors[key] = RateGovernor(action, self.store, key=key)
+
+            return self.governors[key]
+
+    def get_hold(self, key: str) -> float:
+        with self._lock:
+            return max(0.0, self.hold_until.get(key, 0) - time.monotonic())
+
+    def report(self, governor: RateGovernor, outcome: str) -> float:
+        if outcome == "ok":
+            governor.success()
+            return 0
+
+        # пауза рассылается всем сессиям аккаунта: уже получившие разрешение
+        # узнают о ней на следующем hold
+        interval = governor.backoff()
+        with self._lock:
+            self.hold_until[governor.key] = max(
+                self.hold_until.get(governor.key, 0), time.monotonic() + interval
+            )
+
+        return interval
+
+    def handle_request(self, request: dict) -> dict:
+        governor = self.get_governor(
+            str(request.get("action", "")), request.get("account")
+        )
+
+        if request.get("op") == "acquire":
+            return {"wait": max(governor.reserve(), self.get_hold(governor.key))}
+
+        if request.get("op") == "hold":
+            return {"wait": self.get_hold(governor.key)}
+
+        if request.get("op") == "report":
+            return {"wait": self.report(governor, str(request.get("outcome")))}
+
+        return {"error": f"unknown op {request.get('op')}"}
+
+    def start(self):
+        self._server = FloodCoordinatorServer(self)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if not self._server:
+            return
+
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+        self._server = None
+        self.store.save()
+
+    def __enter__(self) -> "FloodCoordinator":
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
@@ -0,0 +1,173 @@
+import asyncio
+import datetime
+from typing import Awaitable, Callable, Optional
+
+import sentry_sdk
+from nng_sdk.logger import get_logger
+
+from helpers.schedule import Schedule
+from helpers.state_store import StateStore
+from services.scraper_service import ScraperService
+
+
+class Job:
+    service: ScraperService
+    run: Callable[[], Awaitable[None]]
+    after: list[str]
+
+    def __init__(
+        self,
+        service: ScraperService,
+        run: Callable[[], Awaitable[None]],
+        after: Optional[list[str]] = None,
+    ):
+        self.service = service
+        self.run = run
+        self.after = after or []
+
+    @property
+    def name(self) -> str:
+        return self.service.name
+
+    @property
+    def schedule(self) -> Schedule:
+        return self.service.schedule
+
+
+class JobScheduler:
+    logger = get_logger()
+
+    jobs: dict[str, Job]
+    store: StateStore
+    last_runs: dict[str, datetime.datetime]
+    next_runs: dict[str, datetime.datetime]
+    running: set[str]
+
+    def __init__(self, state_path: str = "scripts_results/schedule.json"):
+        self.jobs = {}
+        self.store = StateStore(state_path)
+        self.last_runs = {
+            name: datetime.datetime.fromisoformat(value)
+            for name, value in self.store.load().items()
+        }
+        self.next_runs = {}
+        self.running = set()
+        self._changed: Optional[asyncio.Condition] = None
+
+    def add_job(
+        self,
+        service: ScraperService,
+        run: Callable[[], Awaitable[None]],
+        sessions: int = 1,
+        after: Optional[list[str]] = None,
+    ):
+        service.set_session_limit(sessions)
+        job = Job(service, run, after)
+        self.jobs[job.name] = job
+
+    def set_dependencies(self, dependencies: dict[str, list[str]]):
+        for name, after in dependencies.items():
+            if name not in self.jobs:
+                raise ValueError(f"unknown job {name}")
+
+            unknown = [i for i in after if i not in self.jobs]
+            if unknown:
+                raise ValueError(f"job {name} depends on unknown jobs {unknown}")
+
+            self.jobs[name].after = after
+
+        self._check_cycles()
+
+    def _check_cycles(self):
+        visited: set[str] = set()
+
+        def visit(name: str, path: list[str]):
+            if name in path:
+                raise ValueError(f"cyclic job dependency: {' -> '.join(path + [name])}")
+
+            if name in visited:
+                return
+
+            for dependency in self.jobs[name].after:
+                visit(dependency, path + [name])
+
+            visited.add(name)
+
+        for job_name in self.jobs:
+            visit(job_name, [])
+
+    def _save_last_run(self, name: str, moment: datetime.datetime):
+        self.last_runs[name] = moment
+        self.store.save(
+            {key: value.isoformat() for key, value in self.last_runs.items()}
+        )
+
+    def _dependency_busy(self, dependency: str) -> bool:
+        # зависимость либо выполняется, либо уже должна была запуститься
+        if dependency in self.running:
+            return True
+
+        next_run = self.next_runs.get(dependency)
+        return next_run is not None and next_run <= datetime.datetime.now()
+
+    async def _notify(self):
+        async with self._changed:
+            self._changed.notify_all()
+
+    def _blocked(self, job: Job) -> bool:
+        # зависимости исключают друг друга: задача ждет свои зависимости, а
+        # зависимость не стартует, пока выполняется задача, которая ее ждет
+        if any(self._dependency_busy(i) for i in job.after):
+            return True
+
+        return any(
+            i.name in self.running for i in self.jobs.values() if job.name in i.after
+        )
+
+    async def _run_job(self, job: Job):
+        async with self._changed:
+            if self._blocked(job):
+                self.logger.info(f"{job.name} ждет завершения связанных задач")
+            await self._changed.wait_for(lambda: not self._blocked(job))
+            self.running.add(job.name)
+
+        started_at = datetime.datetime.now()
+        await self._notify()
+
+        try:
+            self.logger.info(f"запускаю {job.name}")
+            await job.run()
+            self.logger.info(f"{job.name} завершен")
+        except Exception as e:
+            sentry_sdk.capture_exception(e)
+            self.logger.error(f"ошибка при выполнении {job.name}: {e}")
+        finally:
+            self._save_last_run(job.name, started_at)
+            self.next_runs[job.name] = job.schedule.next_run(
+                started_at, datetime.datetime.now()
+            )
+            self.running.discard(job.name)
+            await self._notify()
+
+    async def _job_loop(self, job: Job):
+        while True:
+            next_run = self.next_runs[job.name]
+            delay = (next_run - datetime.datetime.now()).total_seconds()
+
+            if delay > 0:
+                self.logger.info(
+                    f"следующий запуск {job.name}: {next_run:%d.%m.%Y %H:%M:%S}"
+                )
+                await asyncio.sleep(delay)
+
+            await self._run_job(job)
+
+    async def run_forever(self):
+        self._changed = asyncio.Condition()
+
+        for job in self.jobs.values():
+            self.next_runs[job.name] = job.schedule.next_run(
+                self.last_runs.get(job.name), datetime.datetime.now()
+            )
+
+        await asyncio.gather(*(self._job_loop(job) for job in self.jobs.values()))
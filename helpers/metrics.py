@@ -0,0 +1,122 @@
+import contextlib
+
+try:
+    import prometheus_client
+except ImportError:
+    prometheus_client = None
+
+
+class NullMetric:
+    # без prometheus_client метрики ничего не делают, а код сервисов не меняется
+    def labels(self, *args, **kwargs) -> "NullMetric":
+        return self
+
+    def inc(self, amount: float = 1):
+        pass
+
+    def dec(self, amount: float = 1):
+        pass
+
+    def set(self, value: float):
+        pass
+
+    def observe(self, value: float):
+        pass
+
+    def time(self):
+        return contextlib.nullcontext()
+
+    def track_inprogress(self):
+        return contextlib.nullcontext()
+
+
+def counter(name: str, documentation: str, labels: list[str]):
+    if not prometheus_client:
+        return NullMetric()
+
+    return prometheus_client.Counter(name, documentation, labels)
+
+
+def gauge(name: str, documentation: str, labels: list[str]):
+    if not prometheus_client:
+        return NullMetric()
+
+    return prometheus_client.Gauge(name, documentation, labels)
+
+
+def histogram(name: str, documentation: str, labels: list[str], buckets: tuple):
+    if not prometheus_client:
+        return NullMetric()
+
+    return prometheus_client.Histogram(name, documentation, labels, buckets=buckets)
+
+
+ITEMS_PROCESSED = counter(
+    "scraper_items_processed_total",
+    "элементы (группы, пользователи), по которым принят итоговый результат",
+    ["service"],
+)
+COMMENTS_INGESTED = counter(
+    "scraper_comments_ingested_total", "комментарии, записанные в бд", ["service"]
+)
+USERS_VERIFIED = counter(
+    "scraper_users_verified_total",
+    "проверенные пользователи по наличию галочки",
+    ["service", "verified"],
+)
+VIOLATIONS_ISSUED = counter(
+    "scraper_violations_issued_total", "выданные нарушения", ["service", "type"]
+)
+PERSPECTIVE_CALLS = counter(
+    "scraper_perspective_calls_total", "запросы к perspective api", ["outcome"]
+)
+TOXICITY_CACHE_LOOKUPS = counter(
+    "scraper_toxicity_cache_lookups_total",
+    "поиск оценки токсичности в кеше",
+    ["outcome"],
+)
+
+SESSION_SECONDS = histogram(
+    "scraper_session_duration_seconds",
+    "длительность сессии скрипта",
+    ["service", "outcome"],
+    (30, 60, 300, 600, 900, 1800, 3600, 7200, 14400, 43200),
+)
+LOGIN_SECONDS = histogram(
+    "scraper_login_duration_seconds",
+    "время входа в вк внутри сессии",
+    ["service"],
+    (1, 2, 5, 10, 20, 30, 60, 120, 300),
+)
+PAGE_LOAD_SECONDS = histogram(
+    "scraper_page_load_seconds",
+    "время загрузки страницы в скрипте",
+    ["service"],
+    (0.1, 0.25, 0.5, 1, 2, 5, 10, 20, 30, 60),
+)
+DB_WRITE_SECONDS = histogram(
+    "scraper_db_write_seconds",
+    "время записи в бд",
+    ["service"],
+    (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+
+RUNNING_SESSIONS = gauge(
+    "scraper_running_sessions", "запущенные сессии скриптов", ["backend"]
+)
+
+# замеры, которые скрипты пишут в поток результатов
+SCRIPT_TIMINGS = {"login": LOGIN_SECONDS, "page_load": PAGE_LOAD_SECONDS}
+
+
+def observe_script_timing(service: str, name: str, seconds: float):
+    if metric := SCRIPT_TIMINGS.get(name):
+        metric.labels(service).observe(seconds)
+
+
+def start_metrics_server(port: int) -> bool:
+    if not prometheus_client:
+        return False
+
+    prometheus_client.start_http_server(port)
+    return True
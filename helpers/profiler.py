@@ -0,0 +1,168 @@
+import asyncio
+import atexit
+import datetime
+import functools
+import inspect
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator
+
+from nng_sdk.logger import get_logger
+
+# методы сервисов, в которых идет обработка результатов скриптов
+INGESTION_METHODS = [
+    "process_records",
+    "update_comments",
+    "update_watermarks",
+    "update_trusts",
+    "resolve_users",
+    "give_warnings_or_ban",
+    "ban_user",
+]
+
+
+class SamplingProfiler:
+    # раз в interval секунд снимает стеки потоков, в которых сейчас выполняются
+    # профилируемые вызовы; стеки пишутся в формате folded (строка
+    # "кадр;кадр;кадр число"), его понимают flamegraph.pl и speedscope
+    logger = get_logger()
+
+    path: str
+    interval: float
+
+    def __init__(self, path: str, interval: float = 0.005):
+        self.path = os.path.join(
+            path, datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+        )
+        self.interval = interval
+        self.stacks: dict[str, Counter] = {}
+        self._targets: dict[int, tuple[int, str]] = {}
+        self._next_token = 0
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._sampler = None
+
+        os.makedirs(self.path, exist_ok=True)
+
+        atexit.register(self.save_all)
+
+    def _ensure_sampler(self):
+        if self._sampler and self._sampler.is_alive():
+            return
+
+        self._sampler = threading.Thread(
+            target=self._sample_forever, name="profiler", daemon=True
+        )
+        self._sampler.start()
+
+    @staticmethod
+    def fold(frame) -> str:
+        names = []
+        while frame:
+            code = frame.f_code
+            filename = os.path.relpath(code.co_filename)
+            names.append(f"{code.co_name} ({filename}:{code.co_firstlineno})")
+            frame = frame.f_back
+
+        return ";".join(reversed(names))
+
+    @staticmethod
+    def is_idle(frame) -> bool:
+        # цикл событий ждет в select, такие снимки только размывают профиль
+        return frame.f_code.co_filename.endswith("selectors.py")
+
+    def _sample_forever(self):
+        while True:
+            time.sleep(self.interval)
+
+            with self._lock:
+                targets = list(self._targets.values())
+
+            if not targets:
+                continue
+
+            frames = sys._current_frames()
+            for thread_id, name in targets:
+                frame = frames.get(thread_id)
+                if frame is None or self.is_idle(frame):
+                    continue
+
+                stack = self.fold(frame)
+                with self._lock:
+                    self.stacks.setdefault(name, Counter())[stack] += 1
+
+    @contextmanager
+    def track(self, name: str) -> Iterator[None]:
+        with self._lock:
+            token = self._next_token
+            self._next_token += 1
+            self._targets[token] = (threading.get_ident(), name)
+
+        self._ensure_sampler()
+
+        try:
+            yield
+        finally:
+            with self._lock:
+                del self._targets[token]
+
+    def save_all(self):
+        # файлы перезаписываются целиком: в них все снимки метода за прогон.
+        # пишутся после run_* и при выходе, а не после каждого вызова, чтобы
+        # не нагружать диском сами профилируемые методы
+        with self._lock:
+            stacks = {name: dict(i) for name, i in self.stacks.items()}
+
+        with self._save_lock:
+            for name, counts in stacks.items():
+                filename = os.path.join(self.path, f"{name}.folded")
+                with open(filename, "w", encoding="utf-8") as f:
+                    for stack, count in sorted(counts.items()):
+                        f.write(f"{stack} {count}\n")
+
+    def wrap(self, name: str, method: Callable, save: bool = False) -> Callable:
+        # run_* выполняются в цикле событий, поэтому в их профиль попадают и
+        # другие задачи, которые работают одновременно с ними
+        if inspect.iscoroutinefunction(method):
+
+            @functools.wraps(method)
+            async def async_wrapper(*args, **kwargs) -> Any:
+                try:
+                    with self.track(name):
+                        return await method(*args, **kwargs)
+                finally:
+                    if save:
+                        await asyncio.to_thread(self.save_all)
+
+            return async_wrapper
+
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs) -> Any:
+            try:
+                with self.track(name):
+                    return method(*args, **kwargs)
+            finally:
+                if save:
+                    self.save_all()
+
+        return wrapper
+
+    def profile_service(self, service):
+        # run_workers общий для всех сервисов и вызывается из их run_*
+        runs = [i for i in dir(service) if i.startswith("run_") and i != "run_workers"]
+        ingestion = [i for i in INGESTION_METHODS if hasattr(service, i)]
+
+        for name in runs + ingestion:
+            setattr(
+                service,
+                name,
+                self.wrap(
+                    f"{service.name}.{name}", getattr(service, name), name in runs
+                ),
+            )
+
+        self.logger.info(f"профилирую {service.name}: {runs + ingestion}")
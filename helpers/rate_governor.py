@@ -0,0 +1,185 @@
+import atexit
+import threading
+import time
+from typing import Optional
+
+from helpers.state_store import StateStore
+
+
+class RatePolicy:
+    # interval: начальная пауза между действиями в секундах, пока нет
+    # выученного значения; minimum и maximum ограничивают подстройку;
+    # flood_penalty: пауза после flood control не короче этой
+    interval: float
+    minimum: float
+    maximum: float
+    burst: int
+    flood_penalty: float
+
+    def __init__(
+        self,
+        interval: float,
+        minimum: float,
+        maximum: float,
+        burst: int = 1,
+        flood_penalty: float = 0,
+    ):
+        self.interval = interval
+        self.minimum = minimum
+        self.maximum = maximum
+        self.burst = burst
+        self.flood_penalty = flood_penalty
+
+
+# паузы, которые раньше были зашиты в скрипты и сервисы: обычные стали
+# начальным интервалом, а паузы после flood control и ошибок вк - нижней
+# границей паузы после backoff
+POLICIES = {
+    "kick_cancel": RatePolicy(30, 2, 300, flood_penalty=30),
+    "story_delete": RatePolicy(5, 0.5, 120, flood_penalty=5),
+    "profile_load": RatePolicy(1, 0.2, 300, flood_penalty=60),
+    "event_log_page": RatePolicy(0.5, 0.1, 120, burst=4, flood_penalty=30),
+    "session_start": RatePolicy(90, 10, 600, flood_penalty=90),
+}
+
+
+class RateGovernor:
+    # корзина токенов: токены копятся со скоростью 1/interval до burst штук,
+    # действие тратит токен. пока вк отвечает нормально, интервал понемногу
+    # сокращается, а на flood control или ошибку сразу удваивается
+    # (AIMD по скорости). выученный интервал сохраняется и служит стартом
+    # для следующего прогона
+    SPEEDUP = 0.95
+    BACKOFF = 2.0
+
+    action: str
+    key: str
+    policy: RatePolicy
+    interval: float
+
+    def __init__(
+        self,
+        action: str,
+        store: Optional["GovernorStore"] = None,
+        policy: Optional[RatePolicy] = None,
+        key: Optional[str] = None,
+    ):
+        # key различает одинаковые действия разных аккаунтов в хранилище
+        self.action = action
+        self.key = key or action
+        self.policy = policy or POLICIES[action]
+        self.store = store
+
+        learned = store.get_interval(self.key) if store else None
+        self.interval = self._clamp(learned or self.policy.interval)
+
+        self.tokens = 1.0
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _clamp(self, interval: float) -> float:
+        return min(self.policy.maximum, max(self.policy.minimum, interval))
+
+    def _refill(self, now: float):
+        self.tokens = min(
+            self.policy.burst,
+            self.tokens + (now - self.updated_at) / self.interval,
+        )
+        self.updated_at = now
+
+    def reserve(self) -> float:
+        # занимает токен и возвращает, сколько нужно подождать до действия
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.tokens -= 1
+
+            if self.tokens >= 0:
+                return 0
+
+            return -self.tokens * self.interval
+
+    def acquire(self):
+        if delay := self.reserve():
+            time.sleep(delay)
+
+    def try_take(self) -> float:
+        # в отличие от reserve не занимает место в очереди: токен берется,
+        # только если он уже накопился, иначе возвращается время ожидания
+        # по текущему интервалу, и после ожидания нужно спросить снова
+        with self._lock:
+            self._refill(time.monotonic())
+
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+
+            return (1 - self.tokens) * self.interval
+
+    def _set_interval(self, interval: float):
+        self._refill(time.monotonic())
+        self.interval = self._clamp(interval)
+
+        if self.store:
+            self.store.set_interval(self.key, self.interval)
+
+    def success(self):
+        with self._lock:
+            self._set_interval(self.interval * self.SPEEDUP)
+
+    def backoff(self) -> float:
+        # после flood control токены сгорают: следующее действие не раньше,
+        # чем через новый интервал и не раньше flood_penalty; сам интервал
+        # до flood_penalty не поднимается, чтобы темп потом быстро вернулся
+        with self._lock:
+            self._set_interval(self.interval * self.BACKOFF)
+            wait = max(self.interval, self.policy.flood_penalty)
+            self.tokens = min(self.tokens, 1 - wait / self.interval)
+            return wait
+
+    def penalize(self):
+        time.sleep(self.backoff())
+
+
+class GovernorStore:
+    # интервалы всех действий в одном json; сессии пишут в него одновременно,
+    # поэтому перед записью файл перечитывается и обновляются только свои ключи
+    SAVE_INTERVAL = 10
+
+    def __init__(self, path: str):
+        self.state = StateStore(path)
+        self.learned = self.state.load()
+        self.changed: dict[str, float] = {}
+        self.saved_at = time.monotonic()
+        self._lock = threading.Lock()
+
+        atexit.register(self.save)
+
+    def get_interval(self, action: str) -> Optional[float]:
+        return self.learned.get(action, {}).get("interval")
+
+    def set_interval(self, action: str, interval: float):
+        with self._lock:
+            self.changed[action] = interval
+            due = time.monotonic() - self.saved_at >= self.SAVE_INTERVAL
+
+        if due:
+            self.save()
+
+    def save(self):
+        with self._lock:
+            changed, self.changed = self.changed, {}
+            self.saved_at = time.monotonic()
+
+        if not changed:
+            return
+
+        learned = self.state.load()
+        for action, interval in changed.items():
+            learned[action] = {
+                "interval": round(interval, 3),
+                "updated_at": time.time(),
+            }
+
+        self.state.save(learned)
+        self.learned = learned
@@ -0,0 +1,70 @@
+import asyncio
+import json
+import os
+from typing import Awaitable, Callable
+
+import sentry_sdk
+
+
+class ResultStream:
+    path: str
+    position: int
+    partial: bytes
+
+    def __init__(self, path: str):
+        self.path = path
+        self.position = 0
+        self.partial = b""
+
+    def read_new(self) -> list[dict]:
+        if not os.path.exists(self.path):
+            return []
+
+        # файл читается байтами: скрипт может дописать строку посреди
+        # многобайтного символа, поэтому декодируются только целые строки
+        with open(self.path, "rb") as f:
+            f.seek(self.position)
+            chunk = f.read()
+            self.position = f.tell()
+
+        lines = (self.partial + chunk).split(b"\n")
+        self.partial = lines.pop()
+
+        records = []
+        for line in lines:
+            if not line.strip():
+                continue
+
+            try:
+                records.append(json.loads(line.decode("utf-8")))
+            except ValueError as e:
+                sentry_sdk.capture_exception(e)
+
+        return records
+
+    async def poll(self, on_records: Callable[[list[dict]], Awaitable[None]]):
+        # одна неудачная проверка не должна останавливать обработку сессии
+        try:
+            records = self.read_new()
+        except Exception as e:
+            sentry_sdk.capture_exception(e)
+            return
+
+        if records:
+            await on_records(records)
+
+    async def follow(
+        self,
+        done: asyncio.Event,
+        on_records: Callable[[list[dict]], Awaitable[None]],
+        interval: float = 1,
+    ):
+        while not done.is_set():
+            await self.poll(on_records)
+
+            try:
+                await asyncio.wait_for(done.wait(), interval)
+            except asyncio.TimeoutError:
+                pass
+
+        await self.poll(on_records)
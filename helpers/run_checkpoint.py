@@ -0,0 +1,80 @@
+import datetime
+import threading
+
+from helpers.state_store import StateStore
+
+
+# чекпоинт прогона сервиса: какие элементы уже обработаны, а какие еще нет;
+# после перезапуска прерванный прогон продолжается с оставшихся элементов
+class RunCheckpoint:
+    store: StateStore
+    state: dict
+
+    def __init__(self, path: str):
+        self.store = StateStore(path)
+        self.state = self.store.load()
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self) -> list[str]:
+        with self._lock:
+            return list(self.state.get("pending", []))
+
+    def resume_or_start(self, items: list[str], max_age: datetime.timedelta) -> bool:
+        now = datetime.datetime.now()
+
+        with self._lock:
+            started_at = self.state.get("started_at")
+            resume = (
+                self.state.get("pending")
+                and started_at
+                and now - datetime.datetime.fromisoformat(started_at) < max_age
+            )
+
+            if resume:
+                done = set(self.state.get("done", []))
+                skipped = set(self.state.get("skipped", []))
+                self.state["pending"] = [
+                    i for i in items if i not in done and i not in skipped
+                ]
+            else:
+                self.state = {
+                    "started_at": now.isoformat(),
+                    "pending": list(items),
+                    "done": [],
+                    "skipped": [],
+                    "attempts": {},
+                }
+
+            self._save()
+            return bool(resume)
+
+    def complete(self, items: list[str]):
+        with self._lock:
+            completed = set(items)
+            self.state["pending"] = [
+                i for i in self.state["pending"] if i not in completed
+            ]
+            self.state["done"].extend(completed - set(self.state["done"]))
+            self._save()
+
+    def fail_pending(self, max_attempts: int) -> list[str]:
+        # засчитывает попытку всем необработанным элементам; исчерпавшие
+        # лимит откладываются до следующего прогона
+        with self._lock:
+            attempts: dict[str, int] = self.state["attempts"]
+            retry = []
+
+            for item in self.state["pending"]:
+                attempts[item] = attempts.get(item, 0) + 1
+                if attempts[item] >= max_attempts:
+                    self.state["skipped"].append(item)
+                else:
+                    retry.append(item)
+
+            self.state["pending"] = retry
+            self._save()
+            return retry
+
+    def _save(self):
+        self.store.save(self.state)
@@ -0,0 +1,62 @@
+import datetime
+import random
+from typing import Optional
+
+
+class Schedule:
+    interval: datetime.timedelta
+    jitter: datetime.timedelta
+    window: Optional[tuple[datetime.time, datetime.time]]
+
+    def __init__(
+        self,
+        interval: datetime.timedelta,
+        jitter: datetime.timedelta = datetime.timedelta(0),
+        window: Optional[tuple[datetime.time, datetime.time]] = None,
+    ):
+        self.interval = interval
+        self.jitter = jitter
+        self.window = window
+
+    def _random_jitter(self) -> datetime.timedelta:
+        return datetime.timedelta(
+            seconds=random.uniform(0, self.jitter.total_seconds())
+        )
+
+    def in_window(self, moment: datetime.datetime) -> bool:
+        if not self.window:
+            return True
+
+        start, end = self.window
+        current = moment.time()
+
+        if start <= end:
+            return start <= current < end
+
+        # окно через полночь, например 23:00-05:00
+        return current >= start or current < end
+
+    def fit_window(self, moment: datetime.datetime) -> datetime.datetime:
+        if self.in_window(moment):
+            return moment
+
+        start, end = self.window
+        window_start = datetime.datetime.combine(moment.date(), start)
+        if window_start <= moment:
+            window_start += datetime.timedelta(days=1)
+
+        window_end = datetime.datetime.combine(window_start.date(), end)
+        if window_end <= window_start:
+            window_end += datetime.timedelta(days=1)
+
+        offset = min(self._random_jitter(), (window_end - window_start) / 2)
+        return window_start + offset
+
+    def next_run(
+        self, last_run: Optional[datetime.datetime], now: datetime.datetime
+    ) -> datetime.datetime:
+        if last_run is None:
+            return self.fit_window(now)
+
+        candidate = last_run + self.interval + self._random_jitter()
+        return self.fit_window(max(candidate, now))
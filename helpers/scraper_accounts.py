@@ -0,0 +1,71 @@
+import hashlib
+import json
+import os
+from typing import Optional
+
+# аккаунт из 1password, под ним работают сервисы, если других не задано
+PRIMARY_ACCOUNT = "main"
+
+
+class ScraperAccount:
+    name: str
+    phone: str
+    password: str
+    totp: str
+
+    def __init__(self, name: str, phone: str, password: str, totp: str):
+        self.name = name
+        self.phone = phone
+        self.password = password
+        self.totp = totp
+
+    def to_env(self) -> dict[str, str]:
+        return {
+            "VK_OTP": self.totp,
+            "VK_USERNAME": self.phone,
+            "VK_PASSWORD": self.password,
+            "SCRAPER_ACCOUNT": self.name,
+        }
+
+
+def load_extra_accounts(path: Optional[str]) -> list[ScraperAccount]:
+    # дополнительные аккаунты: json-список {"name", "phone", "password", "totp"}
+    if not path or not os.path.exists(path):
+        return []
+
+    with open(path, "r", encoding="utf-8") as f:
+        accounts = [ScraperAccount(**i) for i in json.load(f)]
+
+    names = [i.name for i in accounts]
+    if PRIMARY_ACCOUNT in names or len(set(names)) != len(names):
+        raise ValueError(
+            f"scraper account names must be unique and not {PRIMARY_ACCOUNT}"
+        )
+
+    return accounts
+
+
+def get_governor_key(action: str, account: Optional[str]) -> str:
+    # у каждого аккаунта свои лимиты в вк, поэтому и свои выученные интервалы
+    if not account or account == PRIMARY_ACCOUNT:
+        return action
+
+    return f"{account}/{action}"
+
+
+def get_shard_weight(account: str, item: str) -> int:
+    digest = hashlib.blake2b(f"{account}:{item}".encode("utf-8"), digest_size=8)
+    return int.from_bytes(digest.digest(), "big")
+
+
+def partition(items: list[str], accounts: list[str]) -> dict[str, list[str]]:
+    # rendezvous hashing: элемент достается аккаунту с наибольшим весом пары,
+    # поэтому между прогонами группа остается за тем же аккаунтом, а при
+    # добавлении аккаунта к нему переезжает только его доля элементов
+    shards: dict[str, list[str]] = {i: [] for i in accounts}
+
+    for item in items:
+        account = max(accounts, key=lambda i: get_shard_weight(i, item))
+        shards[account].append(item)
+
+    return shards
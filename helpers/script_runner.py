@@ -0,0 +1,159 @@
+import asyncio
+import os
+import sys
+import time
+from collections import deque
+from typing import Optional
+
+from nng_sdk.logger import get_logger
+
+from helpers.metrics import RUNNING_SESSIONS
+
+
+class ScriptResult:
+    session_name: str
+    return_code: Optional[int]
+    timed_out: bool
+    duration: float
+    stdout_tail: list[str]
+    stderr_tail: list[str]
+
+    def __init__(
+        self,
+        session_name: str,
+        return_code: Optional[int],
+        timed_out: bool,
+        duration: float,
+        stdout_tail: list[str],
+        stderr_tail: list[str],
+    ):
+        self.session_name = session_name
+        self.return_code = return_code
+        self.timed_out = timed_out
+        self.duration = duration
+        self.stdout_tail = stdout_tail
+        self.stderr_tail = stderr_tail
+
+    @property
+    def ok(self) -> bool:
+        return not self.timed_out and self.return_code == 0
+
+
+class ScriptRunner:
+    TAIL_LINES = 30
+
+    BACKENDS = ("browserstack", "local")
+
+    # примерный расход памяти одним headless хромом
+    LOCAL_BROWSER_MEMORY = 512 * 1024 * 1024
+
+    logger = get_logger()
+
+    parallel_sessions: int
+    local_sessions: int
+
+    def __init__(self, parallel_sessions: int = 1, local_sessions: int = 0):
+        self.set_parallel_sessions(parallel_sessions)
+        self.set_local_sessions(local_sessions or self.get_local_pool_size())
+
+    def set_parallel_sessions(self, parallel_sessions: int):
+        # лимит тарифа browserstack на параллельные сессии
+        self.parallel_sessions = parallel_sessions
+        self.sessions = asyncio.Semaphore(parallel_sessions)
+
+    def set_local_sessions(self, local_sessions: int):
+        # пул локальных браузеров, ограничен ресурсами хоста
+        self.local_sessions = local_sessions
+        self.local_pool = asyncio.Semaphore(local_sessions)
+
+    @classmethod
+    def get_local_pool_size(cls) -> int:
+        cpus = os.cpu_count() or 1
+
+        try:
+            memory = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_AVPHYS_PAGES")
+        except (ValueError, OSError, AttributeError):
+            return cpus
+
+        return max(1, min(cpus, memory // cls.LOCAL_BROWSER_MEMORY))
+
+    @staticmethod
+    def build_command(script: str, backend: str = "browserstack") -> list[str]:
+        if backend == "local":
+            return [sys.executable, script]
+
+        return [
+            "browserstack-sdk",
+            script,
+            "--browserstack.config",
+            "browserstack.yml",
+        ]
+
+    @staticmethod
+    def build_env(env_vars: dict[str, str]) -> dict[str, str]:
+        # скрипты импортируют scripts.common, поэтому нужен корень репозитория
+        python_path = os.pathsep.join(
+            filter(None, [os.getcwd(), os.environ.get("PYTHONPATH")])
+        )
+        return {**os.environ, **env_vars, "PYTHONPATH": python_path}
+
+    @staticmethod
+    async def _pump(stream: asyncio.StreamReader, log, prefix: str, tail: deque):
+        async for raw_line in stream:
+            line = raw_line.decode("utf-8", errors="replace").rstrip()
+            tail.append(line)
+            log.write(f"[{prefix}] {line}\n")
+
+    async def run(
+        self,
+        script: str,
+        env_vars: dict[str, str],
+        session_name: str,
+        log_path: str,
+        timeout: Optional[float] = None,
+        backend: str = "browserstack",
+    ) -> ScriptResult:
+        stdout_tail: deque[str] = deque(maxlen=self.TAIL_LINES)
+        stderr_tail: deque[str] = deque(maxlen=self.TAIL_LINES)
+        os.makedirs(os.path.dirname(log_path), exist_ok=True)
+
+        pool = self.local_pool if backend == "local" else self.sessions
+
+        async with pool:
+            with RUNNING_SESSIONS.labels(backend).track_inprogress():
+                started_at = time.monotonic()
+                process = await asyncio.create_subprocess_exec(
+                    *self.build_command(script, backend),
+                    env=self.build_env({**env_vars, "DRIVER_BACKEND": backend}),
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.PIPE,
+                )
+
+                timed_out = False
+                with open(log_path, "w", encoding="utf-8") as log:
+                    pumps = asyncio.gather(
+                        self._pump(process.stdout, log, "stdout", stdout_tail),
+                        self._pump(process.stderr, log, "stderr", stderr_tail),
+                        process.wait(),
+                    )
+
+                    try:
+                        await asyncio.wait_for(pumps, timeout)
+                    except asyncio.TimeoutError:
+                        timed_out = True
+                        self.logger.error(
+                            f"сессия {session_name} превысила {timeout} с"
+                        )
+                        process.kill()
+                        await process.wait()
+
+                duration = time.monotonic() - started_at
+
+        return ScriptResult(
+            session_name,
+            process.returncode,
+            timed_out,
+            duration,
+            list(stdout_tail),
+            list(stderr_tail),
+        )
@@ -0,0 +1,36 @@
+import json
+import os
+import threading
+from typing import Any
+
+
+class StateStore:
+    path: str
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+
+    def load(self) -> dict[str, Any]:
+        with self._lock:
+            if not os.path.exists(self.path):
+                return {}
+
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    return json.load(f)
+            except json.JSONDecodeError:
+                return {}
+
+    def save(self, state: dict[str, Any]):
+        with self._lock:
+            temp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(state, f, indent=4, ensure_ascii=False, default=str)
+
+            # запись через временный файл, чтобы не оставить обрезанный json
+            os.replace(temp_path, self.path)
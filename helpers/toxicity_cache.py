@@ -0,0 +1,154 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    # копипаста отличается регистром, пробелами и похожими символами
+    text = unicodedata.normalize("NFKC", text).casefold()
+    return WHITESPACE_PATTERN.sub(" ", text).strip()
+
+
+def get_key(text: str, attribute: str, language: str) -> str:
+    digest = hashlib.blake2b(normalize_text(text).encode("utf-8"), digest_size=16)
+    return f"{attribute}:{language}:{digest.hexdigest()}"
+
+
+class ToxicityCache:
+    # оценки perspective по хешу нормализованного текста: горячие ключи
+    # в памяти (lru), все остальные в sqlite. записи старше ttl не отдаются,
+    # а при переполнении удаляются давно не использованные
+    TTL = 60 * 60 * 24 * 30
+    MAX_ENTRIES = 1_000_000
+    MEMORY_ENTRIES = 50_000
+
+    path: str
+    ttl: float
+    max_entries: int
+    memory_entries: int
+
+    def __init__(
+        self,
+        path: str,
+        ttl: float = TTL,
+        max_entries: int = MAX_ENTRIES,
+        memory_entries: int = MEMORY_ENTRIES,
+    ):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+        self.memory: OrderedDict[str, tuple[float, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+
+        # результаты обрабатываются в нескольких потоках, соединение одно
+        self.connection = sqlite3.connect(self.path, check_same_thread=False)
+        with self.connection:
+            self.connection.execute("pragma journal_mode=wal")
+            self.connection.execute(
+                "create table if not exists scores ("
+                "key text primary key, "
+                "attribute text not null, "
+                "language text not null, "
+                "score real not null, "
+                "created_at real not null, "
+                "used_at real not null)"
+            )
+            self.connection.execute(
+                "create index if not exists scores_used_at on scores (used_at)"
+            )
+            self.connection.execute(
+                "create index if not exists scores_created_at on scores (created_at)"
+            )
+
+    def _remember(self, key: str, score: float, created_at: float):
+        self.memory[key] = (score, created_at)
+        self.memory.move_to_end(key)
+
+        while len(self.memory) > self.memory_entries:
+            self.memory.popitem(last=False)
+
+    def get_many(self, keys: list[str]) -> dict[str, float]:
+        now = time.time()
+        found = {}
+
+        with self._lock:
+            missing = []
+            for key in set(keys):
+                cached = self.memory.get(key)
+                if cached and now - cached[1] < self.ttl:
+                    self.memory.move_to_end(key)
+                    found[key] = cached[0]
+                else:
+                    self.memory.pop(key, None)
+                    missing.append(key)
+
+            # sqlite ограничивает число параметров в запросе
+            for start in range(0, len(missing), 500):
+                chunk = missing[start : start + 500]
+                rows = self.connection.execute(
+                    "select key, score, created_at from scores "
+                    f"where key in ({','.join('?' * len(chunk))}) and created_at > ?",
+                    [*chunk, now - self.ttl],
+                ).fetchall()
+
+                for key, score, created_at in rows:
+                    self._remember(key, score, created_at)
+                    found[key] = score
+
+            with self.connection:
+                self.connection.executemany(
+                    "update scores set used_at = ? where key = ?",
+                    [(now, key) for key in found],
+                )
+
+        return found
+
+    def put_many(self, scores: dict[str, float], attribute: str, language: str):
+        if not scores:
+            return
+
+        now = time.time()
+
+        with self._lock:
+            for key, score in scores.items():
+                self._remember(key, score, now)
+
+            with self.connection:
+                self.connection.executemany(
+                    "insert or replace into scores values (?, ?, ?, ?, ?, ?)",
+                    [
+                        (key, attribute, language, score, now, now)
+                        for key, score in scores.items()
+                    ],
+                )
+
+                self._evict(now)
+
+    def _evict(self, now: float):
+        self.connection.execute(
+            "delete from scores where created_at <= ?", [now - self.ttl]
+        )
+
+        (count,) = self.connection.execute("select count(*) from scores").fetchone()
+        if count <= self.max_entries:
+            return
+
+        # удаляется с запасом, чтобы не чистить на каждой записи
+        excess = count - int(self.max_entries * 0.9)
+        self.connection.execute(
+            "delete from scores where key in "
+            "(select key from scores order by used_at limit ?)",
+            [excess],
+        )
@@ -0,0 +1,58 @@
+import math
+import statistics
+import threading
+
+from helpers.state_store import StateStore
+
+
+class WorkPlanner:
+    SMOOTHING = 0.3
+
+    store: StateStore
+    default_cost: float
+    target_duration: float
+    costs: dict[str, float]
+
+    def __init__(self, path: str, default_cost: float, target_duration: float):
+        self.store = StateStore(path)
+        self.default_cost = default_cost
+        self.target_duration = target_duration
+        self.costs = self.store.load()
+        self._lock = threading.Lock()
+
+    def record(self, item: str, seconds: float):
+        with self._lock:
+            previous = self.costs.get(item)
+            if previous is None:
+                self.costs[item] = seconds
+            else:
+                self.costs[item] = (
+                    self.SMOOTHING * seconds + (1 - self.SMOOTHING) * previous
+                )
+
+    def save(self):
+        with self._lock:
+            self.store.save(dict(self.costs))
+
+    def get_cost(self, item: str) -> float:
+        return self.costs.get(item, self._unknown_cost())
+
+    def _unknown_cost(self) -> float:
+        # для новых элементов берем медиану уже измеренных
+        if not self.costs:
+            return self.default_cost
+
+        return statistics.median(self.costs.values())
+
+    def order(self, items: list[str]) -> list[str]:
+        # самые долгие элементы раздаются первыми, чтобы в конце прогона
+        # воркеры добирали короткие и заканчивали примерно одновременно
+        unknown_cost = self._unknown_cost()
+        return sorted(
+            items, key=lambda i: self.costs.get(i, unknown_cost), reverse=True
+        )
+
+    def sessions_needed(self, items: list[str]) -> int:
+        unknown_cost = self._unknown_cost()
+        total_cost = sum(self.costs.get(i, unknown_cost) for i in items)
+        return max(1, math.ceil(total_cost / self.target_duration))
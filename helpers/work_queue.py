@@ -0,0 +1,144 @@
+import json
+import socketserver
+import threading
+from collections import deque
+from typing import Callable, Optional
+
+
+class WorkQueueHandler(socketserver.StreamRequestHandler):
+    server: "WorkQueueServer"
+
+    def handle(self):
+        sessions: set[str] = set()
+
+        try:
+            for line in self.rfile:
+                if not line.strip():
+                    continue
+
+                request: dict = json.loads(line)
+                if request.get("session"):
+                    sessions.add(request["session"])
+
+                response = self.server.queue.handle_request(request)
+                self.wfile.write((json.dumps(response) + "\n").encode("utf-8"))
+                self.wfile.flush()
+        finally:
+            # воркер отключился: неподтвержденные элементы возвращаются в очередь
+            for session_name in sessions:
+                self.server.queue.release(session_name)
+
+
+class WorkQueueServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    queue: "WorkQueue"
+
+    def __init__(self, queue: "WorkQueue"):
+        self.queue = queue
+        super().__init__(("127.0.0.1", 0), WorkQueueHandler)
+
+
+# скрипт в режиме воркера логинится один раз и забирает элементы по одному
+# запросом {"op": "next"} по QUEUE_ADDRESS, а после обработки подтверждает
+# каждый запросом {"op": "ack"}; свободный воркер сразу берет следующий
+class WorkQueue:
+    items: deque[str]
+    in_flight: dict[str, set[str]]
+    attempts: dict[str, int]
+    handed_out: dict[str, int]
+    failed: list[str]
+    max_attempts: int
+
+    on_item_done: Optional[Callable[[str, float], None]]
+
+    def __init__(
+        self,
+        items: list[str],
+        on_item_done: Optional[Callable[[str, float], None]] = None,
+        max_attempts: int = 2,
+    ):
+        self.items = deque(items)
+        self.in_flight = {}
+        self.attempts = {}
+        self.handed_out = {}
+        self.failed = []
+        self.max_attempts = max_attempts
+        self.on_item_done = on_item_done
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    @property
+    def address(self) -> str:
+        host, port = self._server.server_address
+        return f"{host}:{port}"
+
+    def remaining(self) -> int:
+        with self._lock:
+            return len(self.items)
+
+    def handed_out_to(self, session_name: str) -> int:
+        with self._lock:
+            return self.handed_out.get(session_name, 0)
+
+    def next_item(self, session_name: str) -> Optional[str]:
+        with self._lock:
+            if not self.items:
+                return None
+
+            item = self.items.popleft()
+            self.attempts[item] = self.attempts.get(item, 0) + 1
+            self.in_flight.setdefault(session_name, set()).add(item)
+            self.handed_out[session_name] = self.handed_out.get(session_name, 0) + 1
+            return item
+
+    def ack(self, session_name: str, item: str, seconds: float):
+        with self._lock:
+            self.in_flight.get(session_name, set()).discard(item)
+
+        if self.on_item_done:
+            self.on_item_done(item, seconds)
+
+    def release(self, session_name: str):
+        with self._lock:
+            for item in self.in_flight.pop(session_name, set()):
+                if self.attempts.get(item, 0) >= self.max_attempts:
+                    self.failed.append(item)
+                    continue
+
+                self.items.appendleft(item)
+
+    def handle_request(self, request: dict) -> dict:
+        session_name = request.get("session", "")
+
+        if request.get("op") == "next":
+            return {"item": self.next_item(session_name)}
+
+        if request.get("op") == "ack":
+            self.ack(session_name, str(request["item"]), float(request["seconds"]))
+            return {}
+
+        return {"error": f"unknown op {request.get('op')}"}
+
+    def start(self):
+        self._server = WorkQueueServer(self)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if not self._server:
+            return
+
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+        self._server = None
+
+    def __enter__(self) -> "WorkQueue":
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
@@ -1,43 +1,149 @@
 import asyncio
+import random
+from typing import Optional
 
+import requests
 import sentry_sdk
-from googleapiclient import discovery
-from googleapiclient.errors import HttpError
+from requests.adapters import HTTPAdapter
+
+from helpers.metrics import PERSPECTIVE_CALLS
+from helpers.rate_governor import RateGovernor, RatePolicy
 
 
 class PerspectiveApi:
-    DELAY_IN_SECONDS = 1
-
-    def __init__(self, api_key: str):
-        self.client = discovery.build(
-            "commentanalyzer",
-            "v1alpha1",
-            developerKey=api_key,
-            discoveryServiceUrl="https://commentanalyzer.googleapis.com/$discovery/rest?version=v1alpha1",
-            static_discovery=False,
+    URL = "https://commentanalyzer.googleapis.com/v1alpha1/comments:analyze"
+    ATTRIBUTE = "TOXICITY"
+    LANGUAGE = "ru"
+
+    # квота perspective по умолчанию: 1 запрос в секунду на проект
+    DEFAULT_QPS = 1
+    CONCURRENCY = 8
+    TIMEOUT = 30
+
+    # на 429 и 5xx запрос повторяется с паузой 1, 2, 4... секунд
+    RETRIES = 6
+    BACKOFF_BASE = 1
+    BACKOFF_MAX = 60
+    RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+    def __init__(
+        self, api_key: str, qps: float = DEFAULT_QPS, concurrency: int = CONCURRENCY
+    ):
+        self.api_key = api_key
+        self.concurrency = concurrency
+
+        # одна сессия с keep-alive на все потоки обработки
+        self.session = requests.Session()
+        self.session.mount(
+            "https://",
+            HTTPAdapter(pool_connections=1, pool_maxsize=concurrency),
+        )
+
+        # корзина токенов общая для всех сессий сервиса: интервал не бывает
+        # короче квоты, а после 429 растет и потом возвращается к ней
+        self.governor = RateGovernor(
+            "perspective",
+            policy=RatePolicy(
+                1 / qps, 1 / qps, self.BACKOFF_MAX, burst=max(1, int(qps))
+            ),
         )
 
     @staticmethod
     def to_fixed(value: float, digits=4) -> float:
         return float(f"{value:.{digits}f}")
 
-    def analyze_toxicity(self, text: str) -> float:
-        analyze_request = {
+    def get_request(self, text: str) -> dict:
+        return {
             "comment": {"text": text},
-            "requestedAttributes": {"TOXICITY": {}},
-            "languages": ["ru"],
+            "requestedAttributes": {self.ATTRIBUTE: {}},
+            "languages": [self.LANGUAGE],
         }
 
+    def get_backoff(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        delay = min(self.BACKOFF_MAX, self.BACKOFF_BASE * 2**attempt)
+        if retry_after and retry_after.isdigit():
+            delay = max(delay, int(retry_after))
+
+        return delay * random.uniform(1, 1.25)
+
+    def _post(self, text: str) -> requests.Response:
+        return self.session.post(
+            self.URL,
+            params={"key": self.api_key},
+            json=self.get_request(text),
+            timeout=self.TIMEOUT,
+        )
+
+    async def _analyze(
+        self, text: str, concurrency: asyncio.Semaphore
+    ) -> Optional[float]:
+        for attempt in range(self.RETRIES + 1):
+            retry_after = None
+
+            async with concurrency:
+                # токен берется прямо перед отправкой: если за время ожидания
+                # пришел 429 и интервал вырос, ждать придется дольше
+                while delay := self.governor.try_take():
+                    await asyncio.sleep(delay)
+
+                try:
+                    response = await asyncio.to_thread(self._post, text)
+                except requests.RequestException as e:
+                    PERSPECTIVE_CALLS.labels("error").inc()
+                    error = e
+                else:
+                    if response.status_code not in self.RETRY_STATUSES:
+                        return self.parse_response(response)
+
+                    error = requests.HTTPError(
+                        f"perspective ответил {response.status_code}",
+                        response=response,
+                    )
+                    retry_after = response.headers.get("Retry-After")
+
+                    if response.status_code == 429:
+                        # квота кончилась: замедляются все запросы, а не только этот
+                        PERSPECTIVE_CALLS.labels("rate_limited").inc()
+                        self.governor.backoff()
+                    else:
+                        PERSPECTIVE_CALLS.labels("error").inc()
+
+            if attempt < self.RETRIES:
+                await asyncio.sleep(self.get_backoff(attempt, retry_after))
+
+        sentry_sdk.capture_exception(error)
+        return None
+
+    def parse_response(self, response: requests.Response) -> Optional[float]:
+        if not response.ok:
+            PERSPECTIVE_CALLS.labels("error").inc()
+            sentry_sdk.capture_exception(
+                requests.HTTPError(
+                    f"perspective ответил {response.status_code}: {response.text}",
+                    response=response,
+                )
+            )
+            return None
+
+        PERSPECTIVE_CALLS.labels("ok").inc()
+        self.governor.success()
+
         try:
-            response = self.client.comments().analyze(body=analyze_request).execute()
-            types: dict = response.get("attributeScores")
-            return self.to_fixed(types.get("TOXICITY").get("summaryScore").get("value"))
-        except AttributeError as attribute:
-            sentry_sdk.capture_exception(attribute)
-            return 0
-        except HttpError as http:
-            if http.status_code != 429:
-                sentry_sdk.capture_exception(http)
-                return 0
-            asyncio.run(asyncio.sleep(1))
-            return self.analyze_toxicity(text)
+            types: dict = response.json().get("attributeScores")
+            return self.to_fixed(
+                types.get(self.ATTRIBUTE).get("summaryScore").get("value")
+            )
+        except (AttributeError, ValueError) as e:
+            sentry_sdk.capture_exception(e)
+            return None
+
+    async def analyze_many(self, texts: list[str]) -> list[Optional[float]]:
+        # запросы идут параллельно, но не быстрее квоты; порядок сохраняется,
+        # None на месте текстов, которые не удалось оценить
+        concurrency = asyncio.Semaphore(self.concurrency)
+        return list(
+            await asyncio.gather(*(self._analyze(i, concurrency) for i in texts))
+        )
+
+    def analyze_toxicity(self, text: str) -> float:
+        return asyncio.run(self.analyze_many([text]))[0] or 0
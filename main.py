@@ -1,4 +1,6 @@
 import asyncio
+import os
+import sys
 
 import sentry_sdk
 from nng_sdk.logger import get_logger
@@ -6,10 +8,16 @@
 from nng_sdk.postgres.nng_postgres import NngPostgres
 from nng_sdk.vk.vk_manager import VkManager
 
+from helpers.flood_coordinator import FloodCoordinator
+from helpers.job_scheduler import JobScheduler
+from helpers.metrics import start_metrics_server
+from helpers.profiler import SamplingProfiler
 from integrations.perspective_api import PerspectiveApi
 from services.comments_service import CommentsService
 from services.cover_service import CoverService
+from services.groups_service import GroupsService
 from services.members_service import MembersService
+from services.scraper_service import ScraperService
 from services.stories_replies_service import StoriesRepliesService
 from services.stories_service import StoriesService
 from services.verify_service import VerifyService
@@ -23,7 +31,11 @@
 
 postgres = NngPostgres()
 op = OpConnect()
-perspective = PerspectiveApi(op.get_perspective_api())
+# квота perspective api в запросах в секунду
+perspective = PerspectiveApi(
+    op.get_perspective_api(),
+    float(os.environ.get("PERSPECTIVE_QPS", PerspectiveApi.DEFAULT_QPS)),
+)
 logger = get_logger()
 vk = VkManager()
 
@@ -37,20 +49,124 @@
 stories_service = StoriesService(postgres, op, vk.api)
 members_service = MembersService(postgres, op)
 
+# локальное профилирование прогонов и обработки результатов: PROFILE=1 или
+# флаг --profile, профили пишутся в PROFILE_PATH/<время запуска>/
+profiler = None
+if os.environ.get("PROFILE") == "1" or "--profile" in sys.argv[1:]:
+    profiler = SamplingProfiler(
+        os.environ.get("PROFILE_PATH", "scripts_results/profiles"),
+        float(os.environ.get("PROFILE_INTERVAL", 0.005)),
+    )
+    for service in [
+        comments_service,
+        verify_service,
+        vk_link_service,
+        cover_service,
+        stories_replies_service,
+        stories_service,
+        members_service,
+    ]:
+        profiler.profile_service(service)
+
+    logger.info(f"профили пишутся в {profiler.path}")
+
+
+def parse_dependencies(value: str) -> dict[str, list[str]]:
+    # формат: "members:stories;comments:vk_link,verify"
+    dependencies: dict[str, list[str]] = {}
+    for rule in filter(None, value.split(";")):
+        name, after = rule.split(":")
+        dependencies[name.strip()] = [i.strip() for i in after.split(",") if i.strip()]
+    return dependencies
+
+
+def get_session_limit(name: str, default: int) -> int:
+    return int(os.environ.get(f"{name.upper()}_SESSIONS", default))
+
+
+def get_driver_backend(name: str) -> str:
+    default = os.environ.get("DRIVER_BACKEND", "browserstack")
+    return os.environ.get(f"{name.upper()}_DRIVER_BACKEND", default)
+
+
+# дополнительные аккаунты для скрапа, см. helpers/scraper_accounts.py
+ScraperService.accounts_path = os.environ.get("SCRAPER_ACCOUNTS_PATH")
+
+# сколько параллельных сессий позволяет тариф browserstack
+ScraperService.runner.set_parallel_sessions(int(os.environ.get("BROWSER_SESSIONS", 2)))
+
+# по умолчанию размер локального пула считается по cpu и свободной памяти
+if os.environ.get("LOCAL_BROWSER_SESSIONS"):
+    ScraperService.runner.set_local_sessions(
+        int(os.environ.get("LOCAL_BROWSER_SESSIONS"))
+    )
+
+# все сессии работают под одним аккаунтом, поэтому лимиты действий в вк
+# у них общие и выдаются одним координатором; FLOOD_COORDINATOR=0 отключает
+if os.environ.get("FLOOD_COORDINATOR", "1") != "0":
+    coordinator = FloodCoordinator()
+    coordinator.start()
+    ScraperService.coordinator_address = coordinator.address
+
+# задачи групп, которые выполняются за одно посещение группы в groups.py
+# вместо отдельных прогонов, например "cover,stories_replies,stories"
+fused_tasks = [i for i in os.environ.get("FUSED_TASKS", "").split(",") if i]
+
+group_jobs = [
+    (cover_service, cover_service.run_covers),
+    (stories_replies_service, stories_replies_service.run_stories_replies),
+    (stories_service, stories_service.run_stories),
+    (comments_service, comments_service.run_comments),
+    (members_service, members_service.run_members),
+]
+
+scheduler = JobScheduler()
+scheduler.add_job(vk_link_service, vk_link_service.run_vk_link)
+scheduler.add_job(
+    verify_service, verify_service.run_verify, get_session_limit("verify", 2)
+)
+
+for service, run in group_jobs:
+    if service.name not in fused_tasks:
+        scheduler.add_job(service, run, get_session_limit(service.name, 1))
+
+if fused_tasks:
+    groups_service = GroupsService(
+        postgres, op, [i[0] for i in group_jobs if i[0].name in fused_tasks]
+    )
+    if profiler:
+        profiler.profile_service(groups_service)
+
+    scheduler.add_job(
+        groups_service, groups_service.run_groups, get_session_limit("groups", 1)
+    )
+
+for job in scheduler.jobs.values():
+    job.service.set_driver_backend(get_driver_backend(job.name))
+
+# members и stories выписывают нарушения, поэтому по умолчанию не пересекаются;
+# зависимости от совмещенных задач пропускаются
+dependencies = parse_dependencies(os.environ.get("JOB_DEPENDENCIES", "members:stories"))
+scheduler.set_dependencies(
+    {
+        name: [i for i in after if i in scheduler.jobs]
+        for name, after in dependencies.items()
+        if name in scheduler.jobs
+    }
+)
+
+
+# /metrics для prometheus, если задан порт и установлен prometheus_client
+if os.environ.get("METRICS_PORT"):
+    if start_metrics_server(int(os.environ.get("METRICS_PORT"))):
+        logger.info(f"метрики доступны на порту {os.environ.get('METRICS_PORT')}")
+    else:
+        logger.warning("prometheus_client не установлен, метрики отключены")
 
-def main():
-    while True:
-        vk_link_service.run_vk_link()
-        verify_service.run_verify()
-        comments_service.run_comments()
-        cover_service.run_covers()
-        stories_replies_service.run_stories_replies()
-        stories_service.run_stories()
-        members_service.run_members()
 
-        logger.info("ожидаю 24 часа")
-        asyncio.run(asyncio.sleep(24 * 60 * 60))
+async def main():
+    await scheduler.run_forever()
 
 
 if __name__ == "__main__":
-    main()
+    asyncio.run(main())
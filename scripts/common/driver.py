@@ -0,0 +1,49 @@
+import json
+import os
+import sys
+from typing import Optional
+
+from selenium import webdriver
+
+DRIVER_PATH = os.environ.get("DRIVER_PATH")
+
+# browserstack: browserstack-sdk сам подменяет webdriver.Chrome на удаленный;
+# local: headless хром на нашем хосте
+DRIVER_BACKEND = os.environ.get("DRIVER_BACKEND", "browserstack")
+
+LOCAL_ARGUMENTS = [
+    "--headless=new",
+    "--no-sandbox",
+    "--disable-dev-shm-usage",
+    "--disable-gpu",
+    "--window-size=1280,1024",
+]
+
+
+def create_browser(
+    options: Optional[webdriver.ChromeOptions] = None,
+) -> webdriver.Chrome:
+    options = options or webdriver.ChromeOptions()
+
+    if DRIVER_BACKEND == "local":
+        for argument in LOCAL_ARGUMENTS:
+            options.add_argument(argument)
+
+    service = webdriver.ChromeService(executable_path=DRIVER_PATH)
+    return webdriver.Chrome(service=service, options=options)
+
+
+def set_session_status(driver: webdriver.Chrome, status: str, reason: str):
+    # статус виден только в browserstack, а локальный хром такой скрипт не
+    # разберет; локально упавшая сессия видна по ненулевому коду выхода
+    if DRIVER_BACKEND != "browserstack":
+        if status == "failed":
+            sys.exit(f"сессия завершилась с ошибкой: {reason}")
+
+        return
+
+    driver.execute_script(
+        'browserstack_executor: {"action": "setSessionStatus", "arguments": '
+        + json.dumps({"status": status, "reason": reason})
+        + "}"
+    )
@@ -0,0 +1,335 @@
+import datetime
+import os
+import re
+import time
+from typing import Callable, Iterator, Optional
+
+from bs4 import BeautifulSoup
+from dateutil import parser
+
+try:
+    import lxml.html
+    from lxml import etree
+except ImportError:
+    lxml = None
+
+# lxml быстрее в разы; bs4 с html.parser остается запасным вариантом,
+# в том числе когда lxml выбран, но не установлен
+EVENT_LOG_PARSER = os.environ.get("EVENT_LOG_PARSER", "lxml")
+if EVENT_LOG_PARSER == "lxml" and not lxml:
+    EVENT_LOG_PARSER = "bs4"
+
+# ограничение времени обхода журнала одной группы, 0 без ограничения
+EVENT_LOG_TIME_LIMIT = float(os.environ.get("EVENT_LOG_TIME_LIMIT", 30 * 60))
+
+COMMENT_TITLES = {"Comment as community", "Wall management"}
+WALL_LINK_PREFIX = "https://vk.com/wall-"
+
+ITEM_CLASS = "groups_edit_event_log_item"
+TITLE_CLASS = "groups_edit_event_log_item_title"
+DATE_CLASS = "groups_edit_event_log_item_date"
+ROW_CLASS = "groups_edit_event_log_item_row"
+LABELED_CLASS = "groups_edit_event_log_item_labeled"
+
+STYLE_URL_PATTERN = re.compile(r"background-image: url\((.*?)\);")
+REPLY_PATTERN = re.compile(r"reply=(\d+)")
+GROUP_PATTERN = re.compile(r"wall-([0-9]+)_")
+POST_PATTERN = re.compile(r"wall-\d+_(\d+)")
+
+
+class Comment:
+    comment_id: int = -1
+    target_group_id: Optional[int] = None
+    group_id: Optional[int] = None
+    post_id: Optional[int] = None
+    author_id: int
+    comment_vk_id: Optional[int] = None
+    posted_on: datetime.datetime
+    text: Optional[str] = None
+    attachments: list[str] = []
+
+
+def parse_datetime(datetime_str):
+    now = datetime.datetime.now()
+
+    if "today" in datetime_str:
+        datetime_str = datetime_str.replace("today", now.strftime("%d %b"))
+    elif "yesterday" in datetime_str:
+        yesterday = now - datetime.timedelta(days=1)
+        datetime_str = datetime_str.replace("yesterday", yesterday.strftime("%d %b"))
+
+    return parser.parse(datetime_str)
+
+
+def apply_wall_link(comment: Comment, href: str):
+    if match_reply := REPLY_PATTERN.search(href):
+        comment.comment_vk_id = int(match_reply.group(1))
+    if match_group := GROUP_PATTERN.search(href):
+        comment.target_group_id = int(match_group.group(1))
+    if match_post := POST_PATTERN.search(href):
+        comment.post_id = int(match_post.group(1))
+
+
+def parse_bs4_item(item) -> Optional[Comment]:
+    title_element = item.select_one(f".{TITLE_CLASS}")
+    if not title_element or title_element.get_text(strip=True) not in COMMENT_TITLES:
+        return None
+
+    comment = Comment()
+
+    admin_element = item.select_one(f".{LABELED_CLASS} .mem_link")
+    if admin_element and "mention_id" in admin_element.attrs:
+        comment.author_id = int(admin_element["mention_id"].replace("id", ""))
+
+    content_element = item.select_one(".wall_reply_text, .wall_module .wall_post_text")
+    if content_element:
+        comment.text = content_element.get_text(strip=True)
+
+    stickers = item.select(".sticker_img_wrapper img")
+    comment.attachments = [img["src"] for img in stickers if img.has_attr("src")]
+
+    for img_elem in item.select(".page_post_thumb_wrap"):
+        if match := STYLE_URL_PATTERN.search(img_elem.get("style", "")):
+            comment.attachments.append(match.group(1))
+
+    datetime_element = item.select_one(f".{DATE_CLASS}")
+    if datetime_element:
+        comment.posted_on = parse_datetime(datetime_element.get_text(strip=True))
+
+    link_element = item.select_one(f".{ROW_CLASS} a[href^='{WALL_LINK_PREFIX}']")
+    if link_element:
+        apply_wall_link(comment, link_element.get("href", ""))
+
+    return comment
+
+
+def parse_bs4_page(html: str) -> tuple[int, Optional[str], list[Optional[Comment]]]:
+    items = BeautifulSoup(html, "html.parser").select(f".{ITEM_CLASS}")
+    first_item = items[0].get_text(strip=True) if items else None
+    return len(items), first_item, [parse_bs4_item(i) for i in items]
+
+
+def get_lxml_text(element) -> str:
+    # то же, что get_text(strip=True) в bs4
+    return "".join(i.strip() for i in element.itertext() if i.strip())
+
+
+class LxmlItemParser:
+    # один обход поддерева записи: нужные элементы определяются по классам,
+    # а вложенность в родительские блоки передается флагами
+    def __init__(self):
+        self.title = None
+        self.admin = None
+        self.content = None
+        self.date = None
+        self.link = None
+        self.stickers: list[str] = []
+        self.thumbs: list[str] = []
+
+    def walk(
+        self,
+        element,
+        in_labeled: bool = False,
+        in_wall_module: bool = False,
+        in_sticker: bool = False,
+        in_row: bool = False,
+    ):
+        for child in element:
+            if not isinstance(child.tag, str):
+                continue
+
+            classes = child.get("class", "").split()
+
+            if classes:
+                if self.title is None and TITLE_CLASS in classes:
+                    self.title = child
+                if self.date is None and DATE_CLASS in classes:
+                    self.date = child
+                if self.admin is None and in_labeled and "mem_link" in classes:
+                    self.admin = child
+                if self.content is None and (
+                    "wall_reply_text" in classes
+                    or in_wall_module
+                    and "wall_post_text" in classes
+                ):
+                    self.content = child
+                if "page_post_thumb_wrap" in classes:
+                    self.thumbs.append(child.get("style", ""))
+
+            if in_sticker and child.tag == "img" and child.get("src") is not None:
+                self.stickers.append(child.get("src"))
+
+            if (
+                self.link is None
+                and in_row
+                and child.tag == "a"
+                and child.get("href", "").startswith(WALL_LINK_PREFIX)
+            ):
+                self.link = child
+
+            if len(child):
+                self.walk(
+                    child,
+                    in_labeled or LABELED_CLASS in classes,
+                    in_wall_module or "wall_module" in classes,
+                    in_sticker or "sticker_img_wrapper" in classes,
+                    in_row or ROW_CLASS in classes,
+                )
+
+    def to_comment(self) -> Optional[Comment]:
+        if self.title is None or get_lxml_text(self.title) not in COMMENT_TITLES:
+            return None
+
+        comment = Comment()
+
+        if self.admin is not None and self.admin.get("mention_id") is not None:
+            comment.author_id = int(self.admin.get("mention_id").replace("id", ""))
+
+        if self.content is not None:
+            comment.text = get_lxml_text(self.content)
+
+        comment.attachments = list(self.stickers)
+        for style in self.thumbs:
+            if match := STYLE_URL_PATTERN.search(style):
+                comment.attachments.append(match.group(1))
+
+        if self.date is not None:
+            comment.posted_on = parse_datetime(get_lxml_text(self.date))
+
+        if self.link is not None:
+            apply_wall_link(comment, self.link.get("href", ""))
+
+        return comment
+
+
+if lxml:
+    LXML_ITEMS = etree.XPath(
+        f"//*[contains(concat(' ', normalize-space(@class), ' '), ' {ITEM_CLASS} ')]"
+    )
+
+
+def parse_lxml_item(item) -> Optional[Comment]:
+    item_parser = LxmlItemParser()
+    item_parser.walk(item)
+    return item_parser.to_comment()
+
+
+def parse_lxml_page(html: str) -> tuple[int, Optional[str], list[Optional[Comment]]]:
+    items = LXML_ITEMS(lxml.html.fromstring(html))
+    first_item = get_lxml_text(items[0]) if items else None
+    return len(items), first_item, [parse_lxml_item(i) for i in items]
+
+
+class EventLogPage:
+    items_count: int
+    first_item: Optional[str]
+    comments: list[Comment]
+
+    def __init__(
+        self, items_count: int, first_item: Optional[str], comments: list[Comment]
+    ):
+        self.items_count = items_count
+        self.first_item = first_item
+        self.comments = comments
+
+
+def parse_page(
+    html: str, group_id: int, backend: str = EVENT_LOG_PARSER
+) -> EventLogPage:
+    if backend == "lxml" and not lxml:
+        raise RuntimeError("парсер lxml выбран, но lxml не установлен")
+
+    parse = parse_lxml_page if backend == "lxml" else parse_bs4_page
+    items_count, first_item, comments = parse(html)
+
+    page = EventLogPage(items_count, first_item, [i for i in comments if i])
+    for comment in page.comments:
+        comment.group_id = group_id
+
+    return page
+
+
+def take_unseen(
+    comments: list[Comment], already_seen: Optional[Callable[[Comment], bool]]
+) -> tuple[list[Comment], bool]:
+    unseen = []
+
+    for comment in comments:
+        # журнал идет от новых записей к старым, дальше только уже виденное
+        if already_seen and hasattr(comment, "posted_on") and already_seen(comment):
+            return unseen, True
+
+        if comment.comment_vk_id:
+            unseen.append(comment)
+
+    return unseen, False
+
+
+def parse_comments(
+    html: str,
+    group_id: int,
+    already_seen: Optional[Callable[[Comment], bool]] = None,
+    backend: str = EVENT_LOG_PARSER,
+) -> list[Comment]:
+    return take_unseen(parse_page(html, group_id, backend).comments, already_seen)[0]
+
+
+# журнал отдается страницами по параметру offset; если вк его проигнорирует,
+# страница повторится, и по ее первой записи обход остановится
+class EventLogPager:
+    url: str
+    offset: int
+    deadline: Optional[float]
+    finished: bool
+    truncated: bool
+
+    def __init__(self, url: str, time_limit: Optional[float] = None):
+        self.url = url
+        self.offset = 0
+        self.deadline = time.monotonic() + time_limit if time_limit else None
+        self.finished = False
+        self.truncated = False
+        self._first_items: set[str] = set()
+
+    def __iter__(self) -> Iterator[str]:
+        while not self.finished:
+            yield self.url if not self.offset else f"{self.url}&offset={self.offset}"
+
+    def advance(self, items_count: int, first_item: Optional[str]) -> bool:
+        # возвращает False, если страница пустая или уже встречалась
+        if not items_count or first_item in self._first_items:
+            self.stop()
+            return False
+
+        self._first_items.add(first_item)
+        self.offset += items_count
+
+        # по ограничению времени журнал прочитан не до конца
+        if self.deadline and time.monotonic() > self.deadline:
+            self.truncated = True
+            self.stop()
+
+        return True
+
+    def stop(self):
+        self.finished = True
+
+
+def iter_event_log(
+    fetch: Callable[[str], str],
+    pager: EventLogPager,
+    group_id: int,
+    already_seen: Optional[Callable[[Comment], bool]] = None,
+) -> Iterator[list[Comment]]:
+    # страницы читаются и разбираются по одной, поэтому память не растет
+    # с длиной журнала, а обработка начинается до конца обхода
+    for page_url in pager:
+        page = parse_page(fetch(page_url), group_id)
+        if not pager.advance(page.items_count, page.first_item):
+            break
+
+        comments, reached_seen = take_unseen(page.comments, already_seen)
+        if reached_seen:
+            pager.stop()
+
+        yield comments
@@ -0,0 +1,57 @@
+from typing import Any, Optional
+
+from selenium.webdriver.remote.webdriver import WebDriver
+from selenium.webdriver.remote.webelement import WebElement
+
+
+# каждый тип страницы объявляет js-экстрактор, который за один вызов
+# execute_script возвращает все нужные поля страницы; поиск по элементам
+# через webdriver стоит запроса на каждый элемент, а в browserstack каждый
+# такой запрос идет по сети
+class PageExtractor:
+    script: str
+
+    def __init__(self, script: str):
+        self.script = script
+
+    def extract(self, driver: WebDriver, *args) -> Any:
+        return driver.execute_script(self.script, *args)
+
+
+TEXT_MATCH = PageExtractor("""
+    const [selector, textSelector, text] = arguments;
+    for (const element of document.querySelectorAll(selector)) {
+        const target = textSelector ? element.querySelector(textSelector) : element;
+        if (target && target.innerText.trim() === text) {
+            return element;
+        }
+    }
+    return null;
+    """)
+
+
+def find_by_text(
+    driver: WebDriver,
+    locator: tuple[str, str],
+    text: str,
+    text_locator: Optional[tuple[str, str]] = None,
+) -> Optional[WebElement]:
+    # локаторы должны быть css-селекторами
+    return TEXT_MATCH.extract(
+        driver, locator[1], text_locator[1] if text_locator else None, text
+    )
+
+
+FLOOD_TEXTS = [
+    "Flood control",
+    "You have tried to open several similar pages too fast",
+]
+
+FLOOD_CHECK = PageExtractor("""
+    const text = document.body ? document.body.innerText : "";
+    return arguments[0].some((i) => text.includes(i));
+    """)
+
+
+def has_flood_control(driver: WebDriver) -> bool:
+    return FLOOD_CHECK.extract(driver, FLOOD_TEXTS)
@@ -0,0 +1,75 @@
+import json
+import os
+import socket
+import threading
+import time
+from typing import Union
+
+from helpers.rate_governor import GovernorStore, RateGovernor
+from helpers.scraper_accounts import get_governor_key
+from scripts.common.worker import SESSION_NAME, parse_address
+
+SCRAPER_ACCOUNT = os.environ.get("SCRAPER_ACCOUNT")
+
+
+class CoordinatedGovernor:
+    # тот же интерфейс, что у RateGovernor, но корзина общая для всех сессий
+    # аккаунта и живет в FloodCoordinator сервиса
+    action: str
+
+    def __init__(self, action: str, address: str):
+        self.action = action
+        self.connection = socket.create_connection(parse_address(address))
+        self.reader = self.connection.makefile("r", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def request(self, op: str, **payload) -> float:
+        request = {
+            "op": op,
+            "action": self.action,
+            "account": SCRAPER_ACCOUNT,
+            "session": SESSION_NAME,
+            **payload,
+        }
+
+        with self._lock:
+            self.connection.sendall((json.dumps(request) + "\n").encode("utf-8"))
+            response = self.reader.readline()
+
+        if not response:
+            raise ConnectionError("flood coordinator closed the connection")
+
+        return float(json.loads(response).get("wait", 0))
+
+    def acquire(self):
+        wait = self.request("acquire")
+        while wait:
+            time.sleep(wait)
+            wait = self.request("hold")
+
+    def success(self):
+        self.request("report", outcome="ok")
+
+    def backoff(self) -> float:
+        return self.request("report", outcome="flood")
+
+    def penalize(self):
+        time.sleep(self.backoff())
+
+
+_stores: dict[str, GovernorStore] = {}
+
+
+def create_governor(action: str) -> Union[RateGovernor, CoordinatedGovernor]:
+    # с COORDINATOR_ADDRESS лимиты общие для всех сессий аккаунта, иначе
+    # у скрипта своя корзина с интервалами из GOVERNOR_PATH
+    if address := os.environ.get("COORDINATOR_ADDRESS"):
+        return CoordinatedGovernor(action, address)
+
+    path = os.environ.get("GOVERNOR_PATH")
+    if path and path not in _stores:
+        _stores[path] = GovernorStore(path)
+
+    return RateGovernor(
+        action, _stores.get(path), key=get_governor_key(action, SCRAPER_ACCOUNT)
+    )
@@ -0,0 +1,67 @@
+import requests
+from requests.adapters import HTTPAdapter
+from selenium.webdriver.remote.webdriver import WebDriver
+from urllib3 import Retry
+
+from scripts.common.vk_urls import vk_url
+
+# после входа браузер находится на мобильной версии, а страницы
+# администрирования на десктопной, поэтому куки собираются и с нее
+COOKIE_URLS = [vk_url("/feed")]
+
+
+# чтение страниц без браузера: те же куки и user agent, что у залогиненного
+# браузера, поэтому вк отдает ту же разметку
+class HttpReader:
+    timeout = 30
+
+    session: requests.Session
+
+    def __init__(
+        self,
+        cookies: list[dict],
+        user_agent: str,
+        language: str,
+        pool_size: int = 8,
+    ):
+        self.session = requests.Session()
+
+        adapter = HTTPAdapter(
+            pool_connections=pool_size,
+            pool_maxsize=pool_size,
+            max_retries=Retry(
+                total=3, backoff_factor=1, status_forcelist=[500, 502, 503, 504]
+            ),
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update(
+            {"User-Agent": user_agent, "Accept-Language": language}
+        )
+
+        for cookie in cookies:
+            self.session.cookies.set(
+                cookie["name"],
+                cookie["value"],
+                domain=cookie.get("domain"),
+                path=cookie.get("path", "/"),
+            )
+
+    @classmethod
+    def from_driver(cls, driver: WebDriver, pool_size: int = 8) -> "HttpReader":
+        cookies = driver.get_cookies()
+        for url in COOKIE_URLS:
+            driver.get(url)
+            cookies.extend(driver.get_cookies())
+
+        user_agent = driver.execute_script("return navigator.userAgent;")
+        language = driver.execute_script("return navigator.language;")
+        return cls(cookies, user_agent, language, pool_size)
+
+    def get(self, url: str) -> requests.Response:
+        response = self.session.get(url, timeout=self.timeout)
+        response.raise_for_status()
+        return response
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,58 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Iterator, Optional
+
+SESSION_NAME = os.environ.get("SESSION_NAME")
+
+
+class ResultWriter:
+    path: str
+
+    def __init__(self, service_name: str):
+        self.path = f"scripts_results/{service_name}/{SESSION_NAME}.jsonl"
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._lock = threading.Lock()
+
+        global current_writer
+        current_writer = self
+
+    def _append(self, record: dict):
+        line = json.dumps(record, default=str, ensure_ascii=False)
+
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+    def write(
+        self, item: int, result: Any, partial: bool = False, truncated: bool = False
+    ):
+        # одна строка на элемент: сервис читает файл во время работы скрипта,
+        # а при падении сессии уже записанное не теряется; partial помечает
+        # промежуточные части результата, за ними последует итоговая запись,
+        # truncated - итоговую запись элемента, обработанного не до конца
+        record = {"item": str(item), "result": result}
+        if partial:
+            record["partial"] = True
+        if truncated:
+            record["truncated"] = True
+
+        self._append(record)
+
+    def write_timing(self, name: str, seconds: float):
+        # замеры идут тем же потоком, сервис отправляет их в метрики
+        self._append({"timing": name, "seconds": round(seconds, 3)})
+
+
+current_writer: Optional[ResultWriter] = None
+
+
+@contextmanager
+def timed(name: str) -> Iterator[None]:
+    started_at = time.monotonic()
+    try:
+        yield
+    finally:
+        if current_writer:
+            current_writer.write_timing(name, time.monotonic() - started_at)
@@ -0,0 +1,266 @@
+import hashlib
+import json
+import os
+import time
+from typing import Optional
+
+import pyotp
+from selenium.common import TimeoutException, WebDriverException
+from selenium.webdriver.chrome.webdriver import WebDriver
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions
+from selenium.webdriver.support.wait import WebDriverWait
+
+from scripts.common.vk_urls import get_origin, is_default_base_url, mobile_url
+
+FEED_URL = mobile_url("/feed")
+
+SESSION_CACHE_PATH = os.environ.get("VK_SESSION_CACHE_PATH", "scripts_results/sessions")
+SESSION_CACHE_MAX_AGE = int(
+    os.environ.get("VK_SESSION_CACHE_MAX_AGE", 7 * 24 * 60 * 60)
+)
+
+VKID_PHONE_INPUT = (
+    By.CSS_SELECTOR,
+    "input.vkuiInput__el",
+)
+
+VKID_PHONE_SUBMIT = (
+    By.CSS_SELECTOR,
+    "button.vkuiButton--lvl-primary",
+)
+
+VKID_OTP_INPUT = (
+    By.NAME,
+    "otp",
+)
+
+VKID_OTP_SUBMIT = (
+    By.CSS_SELECTOR,
+    "button.vkc__ConfirmOTP__buttonSubmit",
+)
+
+VKID_OTP_SUBMIT_ALT = (
+    By.CSS_SELECTOR,
+    "button.vkc__BottomAuthenticatorOTP__button",
+)
+
+VKID_PASSWORD_INPUT = (
+    By.NAME,
+    "password",
+)
+
+VKID_PASSWORD_SUBMIT = (
+    By.CSS_SELECTOR,
+    "button.vkuiButton--lvl-primary",
+)
+
+
+def retry_code(driver: WebDriver, totp: pyotp.TOTP):
+    WebDriverWait(driver, 5).until(
+        expected_conditions.presence_of_element_located(VKID_OTP_INPUT),
+    )
+
+    try:
+        WebDriverWait(driver, 2).until(
+            expected_conditions.presence_of_element_located(VKID_OTP_SUBMIT),
+        )
+    except TimeoutException:
+        WebDriverWait(driver, 2).until(
+            expected_conditions.presence_of_element_located(VKID_OTP_SUBMIT_ALT),
+        )
+
+    code = totp.now()
+    otp_input = driver.find_element(*VKID_OTP_INPUT)
+    otp_input.clear()
+    otp_input.send_keys(code)
+
+    submits = driver.find_elements(*VKID_OTP_SUBMIT)
+    submits_alt = driver.find_elements(*VKID_OTP_SUBMIT_ALT)
+
+    if submits:
+        submits[0].click()
+    elif submits_alt:
+        submits_alt[0].click()
+    else:
+        raise RuntimeError("no confirm otp button found")
+
+    check_for_auth_flood_control(driver)
+
+    try:
+        WebDriverWait(driver, 2).until(
+            expected_conditions.presence_of_element_located(
+                (By.CSS_SELECTOR, ".vkc__TextField__errorMessage")
+            )
+        )
+        retry_code(driver, totp)
+    except TimeoutException:
+        return
+
+
+def fill_in_password(driver: WebDriver, password: str):
+    WebDriverWait(driver, 10).until(
+        expected_conditions.presence_of_element_located(VKID_PASSWORD_INPUT)
+    )
+
+    driver.find_element(*VKID_PASSWORD_INPUT).send_keys(password)
+    driver.find_element(*VKID_PASSWORD_SUBMIT).submit()
+
+
+def check_for_auth_flood_control(driver: WebDriver):
+    try:
+        WebDriverWait(driver, 2).until(
+            expected_conditions.presence_of_element_located(
+                (
+                    By.XPATH,
+                    "//*[contains(text(), 'Flood control')]",
+                )
+            )
+        )
+    except (TimeoutException, TypeError):
+        pass
+    else:
+        time.sleep(10)
+        return
+
+    try:
+        WebDriverWait(driver, 2).until(
+            expected_conditions.presence_of_element_located(
+                (
+                    By.XPATH,
+                    "//*[contains(text(), 'You have no more code input attempts left')]",
+                )
+            )
+        )
+    except (TimeoutException, TypeError):
+        pass
+    else:
+        time.sleep(30)
+        return
+
+
+def auth(driver: WebDriver, phone: str, password: str, totp: pyotp.TOTP):
+    driver.get(mobile_url("/join?vkid_auth_type=sign_in"))
+
+    WebDriverWait(driver, 60).until(
+        expected_conditions.presence_of_element_located(VKID_PHONE_INPUT)
+    )
+
+    driver.find_element(*VKID_PHONE_INPUT).send_keys(phone)
+    driver.find_element(*VKID_PHONE_SUBMIT).click()
+
+    try:
+        retry_code(driver, totp)
+        fill_in_password(driver, password)
+    except TimeoutException:
+        fill_in_password(driver, password)
+        retry_code(driver, totp)
+
+    time.sleep(1)
+
+    WebDriverWait(driver, 60).until(expected_conditions.url_matches(FEED_URL))
+
+
+def get_session_cache_file(phone: str) -> str:
+    # сессия подмененного вк не должна затирать настоящую
+    key = phone if is_default_base_url() else f"{phone}@{FEED_URL}"
+    digest = hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+    return os.path.join(SESSION_CACHE_PATH, f"{digest}.json")
+
+
+def get_local_storage(driver: WebDriver) -> dict[str, str]:
+    return driver.execute_script("return Object.assign({}, window.localStorage);")
+
+
+def save_session(driver: WebDriver, phone: str):
+    origin = driver.execute_script("return window.location.origin;")
+    session = {
+        "saved_at": time.time(),
+        "cookies": driver.get_cookies(),
+        "local_storage": {origin: get_local_storage(driver)},
+    }
+
+    os.makedirs(SESSION_CACHE_PATH, exist_ok=True)
+    filename = get_session_cache_file(phone)
+    temp_filename = f"{filename}.{os.getpid()}.tmp"
+
+    # в файле лежат авторизованные куки, поэтому доступ только владельцу
+    descriptor = os.open(temp_filename, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(descriptor, "w", encoding="utf-8") as f:
+        json.dump(session, f)
+
+    os.replace(temp_filename, filename)
+
+
+def load_session(phone: str) -> Optional[dict]:
+    filename = get_session_cache_file(phone)
+    if not os.path.exists(filename):
+        return None
+
+    try:
+        with open(filename, "r", encoding="utf-8") as f:
+            session = json.load(f)
+    except json.JSONDecodeError:
+        return None
+
+    if time.time() - session.get("saved_at", 0) > SESSION_CACHE_MAX_AGE:
+        return None
+
+    return session
+
+
+def forget_session(phone: str):
+    filename = get_session_cache_file(phone)
+    if os.path.exists(filename):
+        os.remove(filename)
+
+
+def restore_session(driver: WebDriver, phone: str) -> bool:
+    session = load_session(phone)
+    if not session:
+        return False
+
+    now = time.time()
+    cookies_by_host: dict[str, list[dict]] = {}
+    for cookie in session["cookies"]:
+        if cookie.get("expiry") and cookie["expiry"] < now:
+            continue
+
+        host = cookie.get("domain", "m.vk.com").lstrip(".")
+        cookies_by_host.setdefault(host, []).append(cookie)
+
+    try:
+        # куки можно выставить только находясь на странице того же домена
+        for host, cookies in cookies_by_host.items():
+            driver.get(f"{get_origin(host)}/robots.txt")
+            for cookie in cookies:
+                try:
+                    driver.add_cookie(cookie)
+                except WebDriverException:
+                    continue
+
+        for origin, items in session.get("local_storage", {}).items():
+            driver.get(f"{origin}/robots.txt")
+            driver.execute_script(
+                "for (const [key, value] of Object.entries(arguments[0]))"
+                " window.localStorage.setItem(key, value);",
+                items,
+            )
+
+        # одна загрузка ленты: без авторизации вк перекинет на страницу входа
+        driver.get(FEED_URL)
+    except WebDriverException:
+        return False
+
+    return driver.current_url.startswith(FEED_URL)
+
+
+def login(driver: WebDriver, phone: str, password: str, totp: pyotp.TOTP):
+    if restore_session(driver, phone):
+        return
+
+    forget_session(phone)
+    driver.delete_all_cookies()
+
+    auth(driver, phone, password, totp)
+    save_session(driver, phone)
@@ -0,0 +1,34 @@
+import os
+from urllib.parse import urlsplit
+
+DEFAULT_BASE_URL = "https://vk.com"
+DEFAULT_MOBILE_URL = "https://m.vk.com"
+
+# вк можно подменить, например сервером записанных страниц benchmarks/replay.py;
+# мобильная версия тогда по умолчанию отдается с того же адреса
+VK_BASE_URL = os.environ.get("VK_BASE_URL", DEFAULT_BASE_URL).rstrip("/")
+VK_MOBILE_URL = os.environ.get(
+    "VK_MOBILE_URL",
+    DEFAULT_MOBILE_URL if VK_BASE_URL == DEFAULT_BASE_URL else VK_BASE_URL,
+).rstrip("/")
+
+
+def vk_url(path: str) -> str:
+    return VK_BASE_URL + path
+
+
+def mobile_url(path: str) -> str:
+    return VK_MOBILE_URL + path
+
+
+def is_default_base_url() -> bool:
+    return VK_BASE_URL == DEFAULT_BASE_URL and VK_MOBILE_URL == DEFAULT_MOBILE_URL
+
+
+def get_origin(host: str) -> str:
+    # у кук есть только домен, поэтому схема и порт берутся из адресов вк
+    for url in [VK_BASE_URL, VK_MOBILE_URL]:
+        if urlsplit(url).hostname == host:
+            return url
+
+    return f"https://{host}"
@@ -0,0 +1,102 @@
+import json
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Iterator, Optional
+
+SESSION_NAME = os.environ.get("SESSION_NAME")
+
+
+def parse_address(address: str) -> tuple[str, int]:
+    host, port = address.rsplit(":", 1)
+    return host, int(port)
+
+
+class QueueClient:
+    def __init__(self, address: str):
+        self.connection = socket.create_connection(parse_address(address))
+        self.reader = self.connection.makefile("r", encoding="utf-8")
+
+    def request(self, payload: dict) -> dict:
+        self.connection.sendall((json.dumps(payload) + "\n").encode("utf-8"))
+        response = self.reader.readline()
+        if not response:
+            raise ConnectionError("work queue closed the connection")
+
+        return json.loads(response)
+
+    def next_item(self) -> Optional[str]:
+        return self.request({"op": "next", "session": SESSION_NAME}).get("item")
+
+    def ack(self, item: str, seconds: float):
+        self.request(
+            {"op": "ack", "session": SESSION_NAME, "item": item, "seconds": seconds}
+        )
+
+    def close(self):
+        self.reader.close()
+        self.connection.close()
+
+
+class ItemSource:
+    def __init__(self, fallback_env: str = "GROUPS"):
+        address = os.environ.get("QUEUE_ADDRESS")
+        # без очереди скрипт работает по-старому: все элементы из fallback_env
+        self.client = QueueClient(address) if address else None
+        self.items = [i for i in os.environ.get(fallback_env, "").split(",") if i]
+        self._lock = threading.Lock()
+
+    def next_item(self) -> Optional[str]:
+        with self._lock:
+            if self.client:
+                return self.client.next_item()
+
+            return self.items.pop(0) if self.items else None
+
+    def ack(self, item: str, seconds: float):
+        # подтверждение с временем обработки: без него элемент вернется
+        # в очередь, если сессия упадет
+        with self._lock:
+            if self.client:
+                self.client.ack(item, seconds)
+
+    def close(self):
+        if self.client:
+            self.client.close()
+
+
+def iter_items(fallback_env: str = "GROUPS") -> Iterator[int]:
+    source = ItemSource(fallback_env)
+    try:
+        while (item := source.next_item()) is not None:
+            started_at = time.monotonic()
+            yield int(item)
+            source.ack(item, time.monotonic() - started_at)
+    finally:
+        source.close()
+
+
+def process_concurrently(
+    process: Callable[[int], Any],
+    on_result: Callable[[int, Any], None],
+    threads: int,
+    fallback_env: str = "GROUPS",
+):
+    # для страниц без браузера: несколько элементов обрабатываются
+    # одновременно, каждый подтверждается после записи результата
+    source = ItemSource(fallback_env)
+
+    def work():
+        while (item := source.next_item()) is not None:
+            started_at = time.monotonic()
+            on_result(int(item), process(int(item)))
+            source.ack(item, time.monotonic() - started_at)
+
+    try:
+        with ThreadPoolExecutor(threads) as executor:
+            for future in [executor.submit(work) for _ in range(threads)]:
+                future.result()
+    finally:
+        source.close()
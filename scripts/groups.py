@@ -0,0 +1,77 @@
+import os
+
+import pyotp
+from selenium import webdriver
+
+from scripts import comment_stats, cover, members, stories, stories_replies
+from scripts.common.driver import create_browser, set_session_status
+from scripts.common.results import ResultWriter, timed
+from scripts.common.vk_auth import login
+from scripts.common.worker import iter_items
+
+TOTP = pyotp.TOTP(os.environ.get("VK_OTP"))
+PHONE = os.environ.get("VK_USERNAME")
+PASSWORD = os.environ.get("VK_PASSWORD")
+
+# порядок важен: задачи выполняются друг за другом за одно посещение группы
+TASKS = {
+    "cover": cover,
+    "stories_replies": stories_replies,
+    "stories": stories,
+    "comments": comment_stats,
+    "members": members,
+}
+
+FUSED_TASKS = [
+    i for i in TASKS if i in os.environ.get("FUSED_TASKS", ",".join(TASKS)).split(",")
+]
+
+DEFAULT_WINDOW_SIZE = (1280, 1024)
+
+options = webdriver.ChromeOptions()
+if "cover" in FUSED_TASKS:
+    options.add_extension("chrome_extensions/i_am_gentlemen.crx")
+else:
+    options.add_argument("--blink-settings=imagesEnabled=false")
+
+
+def process_group(group_id: int) -> dict:
+    result = {}
+
+    for task in FUSED_TASKS:
+        module = TASKS[task]
+        browser.set_window_size(*getattr(module, "WINDOW_SIZE", DEFAULT_WINDOW_SIZE))
+        result[task] = module.process_group(group_id)
+
+    return result
+
+
+def main():
+    # все задачи работают с одним браузером и одной авторизацией
+    for task in FUSED_TASKS:
+        TASKS[task].browser = browser
+
+    if "cover" in FUSED_TASKS:
+        cover.download_cover()
+
+    results = ResultWriter("groups")
+    with timed("login"):
+        login(browser, PHONE, PASSWORD, TOTP)
+    browser.implicitly_wait(1)
+
+    for group_id in iter_items():
+        results.write(group_id, process_group(group_id))
+
+    set_session_status(browser, "passed", "success")
+
+
+if __name__ == "__main__":
+    browser = create_browser(options)
+
+    try:
+        main()
+    except Exception as e:
+        message = str(e)
+        set_session_status(browser, "failed", message)
+    finally:
+        browser.quit()
@@ -1,4 +1,3 @@
-import json
 import os
 import time
 
@@ -7,68 +6,48 @@
 from selenium import webdriver
 from selenium.common import TimeoutException, NoSuchElementException
 from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.webdriver import WebDriver
 from selenium.webdriver.support import expected_conditions
 from selenium.webdriver.support.ui import WebDriverWait
 
-DRIVER_PATH = os.environ.get("DRIVER_PATH")
+from scripts.common.driver import create_browser, set_session_status
+from scripts.common.extract import PageExtractor, has_flood_control
+from scripts.common.governor import create_governor
+from scripts.common.results import ResultWriter, timed
+from scripts.common.vk_auth import login
+from scripts.common.vk_urls import vk_url
+from scripts.common.worker import iter_items
 
 TOTP = pyotp.TOTP(os.environ.get("VK_OTP"))
 PHONE = os.environ.get("VK_USERNAME")
 PASSWORD = os.environ.get("VK_PASSWORD")
-GROUPS = [int(i) for i in os.environ.get("GROUPS").split(",")]
 SESSION_NAME = os.environ.get("SESSION_NAME")
 
-service = webdriver.ChromeService(executable_path=DRIVER_PATH)
-
 options = webdriver.ChromeOptions()
 options.add_argument("--blink-settings=imagesEnabled=false")
 
-browser = webdriver.Chrome(service=service, options=options)
-browser.set_window_size(420, 932)
-
-VKID_PHONE_INPUT = (
-    By.CSS_SELECTOR,
-    "input.vkuiInput__el",
-)
-
-VKID_PHONE_SUBMIT = (
-    By.CSS_SELECTOR,
-    "button.vkuiButton--lvl-primary",
-)
-
-VKID_OTP_INPUT = (
-    By.NAME,
-    "otp",
-)
-
-VKID_OTP_SUBMIT = (
-    By.CSS_SELECTOR,
-    "button.vkc__ConfirmOTP__buttonSubmit",
-)
-
-VKID_OTP_SUBMIT_ALT = (
-    By.CSS_SELECTOR,
-    "button.vkc__BottomAuthenticatorOTP__button",
-)
-
-VKID_PASSWORD_INPUT = (
-    By.NAME,
-    "password",
-)
-
-VKID_PASSWORD_SUBMIT = (
-    By.CSS_SELECTOR,
-    "button.vkuiButton--lvl-primary",
-)
-
-STORY_PARENT = (By.CSS_SELECTOR, ".story_stats_row")
-
-STORY_INFO_PARENT = (By.CSS_SELECTOR, ".story_stats_row_info")
-STORY_USER_LINK = (By.CSS_SELECTOR, ".story_stats_row_info_link")
-
-STORY_NAME_PARENT = (By.CSS_SELECTOR, ".story_stats_row_info_top")
-STORY_NAME_CHILD = (By.CSS_SELECTOR, "span")
+WINDOW_SIZE = (420, 932)
+
+DELETE_GOVERNOR = create_governor("story_delete")
+
+# строки историй с автором и признаком удаленного автора
+STORIES_EXTRACTOR = PageExtractor("""
+    const stories = [];
+    for (const row of document.querySelectorAll(".story_stats_row")) {
+        const info = row.querySelector(".story_stats_row_info");
+        if (!info) {
+            continue;
+        }
+
+        const name = info.querySelector(".story_stats_row_info_top span");
+        const link = info.querySelector(".story_stats_row_info_link");
+        stories.push({
+            row: row,
+            deleted: !!name && name.innerText.toLowerCase().includes("deleted"),
+            href: link ? link.href : null,
+        });
+    }
+    return stories;
+    """)
 
 STORY_DELETE_BUTTON = (By.CSS_SELECTOR, ".story_stats_row_deleteButton")
 
@@ -76,156 +55,79 @@
 CONFIRM_DELETE_BUTTON = (By.CSS_SELECTOR, "button.FlatButton--primary")
 
 
-def retry_code(driver: WebDriver, totp: TOTP):
-    WebDriverWait(driver, 5).until(
-        expected_conditions.presence_of_element_located(VKID_OTP_INPUT),
-    )
+def get_all_stories(group_id: int) -> list[dict]:
+    target_url = vk_url(f"/club{group_id}?act=stories")
 
-    try:
-        WebDriverWait(driver, 2).until(
-            expected_conditions.presence_of_element_located(VKID_OTP_SUBMIT),
-        )
-    except TimeoutException:
-        WebDriverWait(driver, 2).until(
-            expected_conditions.presence_of_element_located(VKID_OTP_SUBMIT_ALT),
-        )
+    with timed("page_load"):
+        if browser.current_url != target_url:
+            browser.get(target_url)
+        else:
+            browser.refresh()
 
-    code = totp.now()
-    otp_input = driver.find_element(*VKID_OTP_INPUT)
-    otp_input.clear()
-    otp_input.send_keys(code)
+    time.sleep(5)
 
-    submits = driver.find_elements(*VKID_OTP_SUBMIT)
-    submits_alt = driver.find_elements(*VKID_OTP_SUBMIT_ALT)
+    return STORIES_EXTRACTOR.extract(browser)
 
-    if submits:
-        submits[0].click()
-    elif submits_alt:
-        submits_alt[0].click()
-    else:
-        raise RuntimeError("no confirm otp button found")
 
+def delete_story(parent: WebElement):
+    DELETE_GOVERNOR.acquire()
+    parent.find_element(*STORY_DELETE_BUTTON).click()
     try:
-        WebDriverWait(driver, 2).until(
-            expected_conditions.presence_of_element_located(
-                (By.CSS_SELECTOR, ".vkc__TextField__errorMessage")
-            )
+        WebDriverWait(browser, 10).until(
+            expected_conditions.presence_of_element_located(CONFIRM_DELETE_BOX)
         )
-        retry_code(driver, totp)
-    except TimeoutException:
+    except (TimeoutException, NoSuchElementException):
         return
+    else:
+        delete_box = browser.find_element(*CONFIRM_DELETE_BOX)
 
+    delete_box.find_element(*CONFIRM_DELETE_BUTTON).click()
 
-def fill_in_password(driver: WebDriver, password: str):
-    WebDriverWait(driver, 10).until(
-        expected_conditions.presence_of_element_located(VKID_PASSWORD_INPUT)
-    )
-
-    driver.find_element(*VKID_PASSWORD_INPUT).send_keys(password)
-    driver.find_element(*VKID_PASSWORD_SUBMIT).submit()
-
-
-def auth(driver: WebDriver, phone: str, password: str, totp: TOTP):
-    driver.get("https://m.vk.com/join?vkid_auth_type=sign_in")
-
-    WebDriverWait(driver, 60).until(
-        expected_conditions.presence_of_element_located(VKID_PHONE_INPUT)
-    )
-
-    driver.find_element(*VKID_PHONE_INPUT).send_keys(phone)
-    driver.find_element(*VKID_PHONE_SUBMIT).click()
-
-    try:
-        retry_code(driver, totp)
-        fill_in_password(driver, password)
-    except TimeoutException:
-        fill_in_password(driver, password)
-        retry_code(driver, totp)
-
-    driver.implicitly_wait(1)
+    if has_flood_control(browser):
+        DELETE_GOVERNOR.penalize()
+    else:
+        DELETE_GOVERNOR.success()
 
-    WebDriverWait(driver, 10).until(
-        expected_conditions.url_matches("https://m.vk.com/feed")
-    )
 
+def process_group(group_id: int) -> list[str]:
+    intruders: list[str] = []
+    stories = [i for i in get_all_stories(group_id) if not i["deleted"]]
 
-def get_all_stories(group_id: int) -> list[WebElement]:
-    target_url = f"https://vk.com/club{group_id}?act=stories"
+    # без ссылки автора не наказать, поэтому страница считается сломанной
+    # до того, как удалена хоть одна история
+    if any(not i["href"] for i in stories):
+        raise NoSuchElementException(
+            f"у истории в группе {group_id} нет ссылки на автора"
+        )
 
-    if browser.current_url != target_url:
-        browser.get(target_url)
-    else:
-        browser.refresh()
+    for story in stories:
+        intruders.append(story["href"])
+        delete_story(story["row"])
 
-    time.sleep(5)
+    return list(set(intruders))
 
-    return browser.find_elements(*STORY_PARENT)
 
+def main():
+    browser.set_window_size(*WINDOW_SIZE)
+    results = ResultWriter("stories")
 
-def is_deleted(info: WebElement) -> bool:
-    try:
-        name_parent = info.find_element(*STORY_NAME_PARENT)
-    except (TimeoutException, NoSuchElementException):
-        return False
+    with timed("login"):
+        login(browser, PHONE, PASSWORD, TOTP)
+    browser.implicitly_wait(1)
 
-    name = name_parent.find_element(*STORY_NAME_CHILD).text
-    return "deleted" in name.lower()
+    for group in iter_items():
+        results.write(group, process_group(group))
 
+    set_session_status(browser, "passed", "success")
 
-def get_user_href(info: WebElement) -> str:
-    return info.find_element(*STORY_USER_LINK).get_attribute("href")
 
+if __name__ == "__main__":
+    browser = create_browser(options)
 
-def delete_story(parent: WebElement):
-    parent.find_element(*STORY_DELETE_BUTTON).click()
     try:
-        WebDriverWait(browser, 10).until(
-            expected_conditions.presence_of_element_located(CONFIRM_DELETE_BOX)
-        )
-    except (TimeoutException, NoSuchElementException):
-        return
-    else:
-        delete_box = browser.find_element(*CONFIRM_DELETE_BOX)
-
-    delete_box.find_element(*CONFIRM_DELETE_BUTTON).click()
-    time.sleep(5)
-
-
-def main():
-    auth(browser, PHONE, PASSWORD, TOTP)
-    output: dict[int, list[str]] = {}
-
-    for group in GROUPS:
-        all_stories = get_all_stories(group)
-        for story in all_stories:
-            info = story.find_element(*STORY_INFO_PARENT)
-            if is_deleted(info):
-                continue
-
-            user_href = get_user_href(info)
-            output[group] = output.get(group, []) + [user_href]
-            delete_story(story)
-
-    output = {int(k): list(set(v)) for k, v in output.items() if v}
-
-    filename = f"scripts_results/stories/{SESSION_NAME}.json"
-    os.makedirs(os.path.dirname(filename), exist_ok=True)
-    with open(filename, "w") as f:
-        f.write(json.dumps(output))
-
-    browser.execute_script(
-        'browserstack_executor: {"action": "setSessionStatus", "arguments": {"status":"passed", "reason": "success"}}'
-    )
-
-
-try:
-    main()
-except Exception as e:
-    message = str(e)
-    browser.execute_script(
-        'browserstack_executor: {"action": "setSessionStatus", "arguments": {"status":"failed", "reason": '
-        + json.dumps(message)
-        + "}}"
-    )
-finally:
-    browser.quit()
+        main()
+    except Exception as e:
+        message = str(e)
+        set_session_status(browser, "failed", message)
+    finally:
+        browser.quit()
@@ -1,19 +1,32 @@
-import json
-import os
+import asyncio
+import datetime
+import threading
 
 import sentry_sdk
 from nng_sdk.one_password.op_connect import OpConnect
 from nng_sdk.postgres.nng_postgres import NngPostgres
 from nng_sdk.pydantic_models.comment import Comment
 
+from helpers import metrics
+from helpers.schedule import Schedule
+from helpers.state_store import StateStore
+from helpers.toxicity_cache import ToxicityCache, get_key
 from services.scraper_service import ScraperService
 from integrations.perspective_api import PerspectiveApi
 
 
 class CommentsService(ScraperService):
+    schedule = Schedule(
+        interval=datetime.timedelta(hours=1), jitter=datetime.timedelta(minutes=10)
+    )
+
+    default_item_cost = 180
+
     postgres: NngPostgres
     op: OpConnect
     perspective: PerspectiveApi
+    watermarks: StateStore
+    toxicity_cache: ToxicityCache
 
     def __init__(
         self, postgres: NngPostgres, op: OpConnect, perspective: PerspectiveApi
@@ -23,16 +36,28 @@ def __init__(
         self.perspective = perspective
         self.postgres = postgres
         self.op = op
+        self.watermarks = StateStore(self.path + "watermarks.json")
+        self.toxicity_cache = ToxicityCache(self.path + "toxicity.sqlite")
+        self._watermarks_lock = threading.Lock()
+        self._unfinished: dict[str, Comment] = {}
 
-    def get_comments_execution_result(self, session_id: str) -> list[Comment]:
-        with open(self.get_session_path(session_id), "r") as f:
-            parsed_object: list[Comment] = json.load(f)
-        return [Comment.model_validate(i) for i in parsed_object]
+    @staticmethod
+    def get_record_comments(record: dict) -> list[Comment]:
+        return [Comment.model_validate(comment) for comment in record["result"]]
 
     def update_comments(self, comments: list[Comment]):
+        new_comments = []
+        seen = set()
         for comment in comments:
+            key = (
+                comment.comment_vk_id,
+                comment.group_id,
+                comment.target_group_id,
+                comment.author_id,
+            )
             if (
-                not comment.comment_vk_id
+                key in seen
+                or not comment.comment_vk_id
                 or not comment.group_id
                 or not comment.author_id
                 or self.postgres.comments.already_exists(
@@ -51,89 +76,140 @@ def update_comments(self, comments: list[Comment]):
                 self.logger.info(f"комментарий {comment.comment_vk_id} пустой")
                 continue
 
-            self.logger.info(
-                f"анализирую комментарий {comment.comment_vk_id} через perspective..."
-            )
+            seen.add(key)
+            new_comments.append(comment)
 
-            if comment.text:
-                try:
-                    toxicity_level = self.perspective.analyze_toxicity(comment.text)
-                except Exception as e:
-                    self.logger.warning(f"ошибка: {e}")
-                    sentry_sdk.capture_exception(e)
-                    comment.toxicity = 0
-                else:
-                    comment.toxicity = toxicity_level
-            else:
-                comment.toxicity = 0
+        if not new_comments:
+            return
 
-            self.postgres.comments.upload_comment(comment)
+        self.score_comments(new_comments)
 
-    def run_comment_instance(self, groups: list[str]):
-        command = [
-            "browserstack-sdk",
-            "scripts/comment_stats.py",
-            "--browserstack.config",
-            "browserstack.yml",
-        ]
+        for comment in new_comments:
+            with metrics.DB_WRITE_SECONDS.labels(self.name).time():
+                self.postgres.comments.upload_comment(comment)
 
-        session_name = self.generate_session_name()
-        self.logger.info(f"запускаю сессию {session_name}")
+            metrics.COMMENTS_INGESTED.labels(self.name).inc()
 
-        stringified_groups = ",".join(groups)
-        env_vars = {
-            "GROUPS": stringified_groups,
-            "SESSION_NAME": session_name,
+    def get_toxicity_key(self, comment: Comment) -> str:
+        return get_key(
+            comment.text, self.perspective.ATTRIBUTE, self.perspective.LANGUAGE
+        )
+
+    def score_comments(self, comments: list[Comment]):
+        # одинаковые тексты (спам, копипаста) оцениваются один раз: сначала
+        # ищутся в кеше, оставшиеся уходят в perspective одной пачкой
+        keys = {
+            self.get_toxicity_key(comment): comment.text
+            for comment in comments
+            if comment.text
         }
+        scores = self.toxicity_cache.get_many(list(keys))
+        missing = [key for key in keys if key not in scores]
 
-        for key, value in env_vars.items():
-            os.environ[key] = value
+        metrics.TOXICITY_CACHE_LOOKUPS.labels("hit").inc(len(keys) - len(missing))
+        metrics.TOXICITY_CACHE_LOOKUPS.labels("miss").inc(len(missing))
 
-        os.system(" ".join(command))
+        if missing:
+            self.logger.info(
+                f"анализирую {len(missing)} комментариев через perspective, "
+                f"из кеша: {len(scores)}"
+            )
 
-        try:
-            comments = self.get_comments_execution_result(session_name)
-            self.update_comments(comments)
-            self.logger.info(f"комментарии сессии {session_name} обновлены")
-            self.cleanup(session_name)
-        except Exception as e:
-            sentry_sdk.capture_exception(e)
-            self.logger.error(f"ошибка при обновлении комментариев: {e}")
+            try:
+                analyzed = asyncio.run(
+                    self.perspective.analyze_many([keys[key] for key in missing])
+                )
+            except Exception as e:
+                self.logger.warning(f"ошибка: {e}")
+                sentry_sdk.capture_exception(e)
+                analyzed = [None] * len(missing)
+
+            # неудачные запросы не кешируются, их оценка 0 только для этой записи
+            fresh = {
+                key: score for key, score in zip(missing, analyzed) if score is not None
+            }
+            self.toxicity_cache.put_many(
+                fresh, self.perspective.ATTRIBUTE, self.perspective.LANGUAGE
+            )
+            scores.update(fresh)
 
-    def run_comments(self):
-        user = self.op.get_scraper_user()
-        self.logger.info("получил сервисную страницу для скрапа")
+        for comment in comments:
+            comment.toxicity = (
+                scores.get(self.get_toxicity_key(comment), 0) if comment.text else 0
+            )
 
-        groups_list = [str(i.group_id) for i in self.postgres.groups.get_all_groups()]
+    def update_watermarks(self, records: list[tuple[dict, list[Comment]]]):
+        # отметка группы сдвигается только по итоговой записи: если сессия
+        # упадет посреди журнала, группа перечитается с прежней отметки.
+        # то же при обходе, прерванном по времени: более старые страницы
+        # не прочитаны, и новая отметка потеряла бы их навсегда
+        with self._watermarks_lock:
+            finished = []
+
+            for record, comments in records:
+                if record.get("truncated"):
+                    self._unfinished.pop(record["item"], None)
+                    self.logger.warning(
+                        f"журнал группы {record['item']} прочитан не до конца, "
+                        "отметка не сдвигается"
+                    )
+                    continue
+
+                candidates = [i for i in comments if i.group_id and i.posted_on]
+                if record["item"] in self._unfinished:
+                    candidates.append(self._unfinished.pop(record["item"]))
+
+                if not candidates:
+                    continue
+
+                newest = max(candidates, key=lambda i: i.posted_on.replace(tzinfo=None))
+                if record.get("partial"):
+                    self._unfinished[record["item"]] = newest
+                else:
+                    finished.append(newest)
 
-        self.logger.info(f"всего групп: {len(groups_list)}")
-        session_name = self.generate_session_name()
-        self.logger.info(f"айди сессии: {session_name}")
+            self._update_watermarks(finished)
 
-        browserstack_credentials = self.op.get_browserstack_credentials()
+    def _update_watermarks(self, comments: list[Comment]):
+        watermarks = self.watermarks.load()
 
-        env_vars = {
-            "VK_OTP": user.totp,
-            "VK_USERNAME": user.phone,
-            "VK_PASSWORD": user.password,
-            "BROWSERSTACK_USERNAME": browserstack_credentials.login,
-            "BROWSERSTACK_ACCESS_KEY": browserstack_credentials.api_key,
-            "BROWSERSTACK_BUILD_NAME": "comments",
-        }
+        for comment in comments:
+            if not comment.group_id or not comment.posted_on:
+                continue
 
-        for key, value in env_vars.items():
-            os.environ[key] = value
+            group = str(comment.group_id)
+            current = watermarks.get(group)
+            if current and datetime.datetime.fromisoformat(
+                current["posted_on"]
+            ) >= comment.posted_on.replace(tzinfo=None):
+                continue
 
-        self.logger.info("запускаю comment_stats")
+            watermarks[group] = {
+                "posted_on": comment.posted_on.replace(tzinfo=None).isoformat(),
+                "comment_vk_id": comment.comment_vk_id,
+            }
 
-        groups_in_chunk = 5
+        self.watermarks.save(watermarks)
 
-        groups_chunks = [
-            groups_list[i : i + groups_in_chunk]
-            for i in range(0, len(groups_list), groups_in_chunk)
-        ]
+    def process_records(self, records: list[dict]):
+        parsed = [(record, self.get_record_comments(record)) for record in records]
+        self.update_comments([i for _, comments in parsed for i in comments])
+        self.update_watermarks(parsed)
+        self.logger.info(f"комментарии групп {[i['item'] for i in records]} обновлены")
 
-        self.logger.info(f"всего сессий: {len(groups_chunks)}")
+    async def run_comments(self):
+        groups = await asyncio.to_thread(self.postgres.groups.get_all_groups)
+        groups_list = [str(i.group_id) for i in groups]
+
+        self.logger.info(f"всего групп: {len(groups_list)}")
+
+        env_vars = {
+            **await self.get_script_env(),
+            "WATERMARKS_PATH": self.watermarks.path,
+        }
+
+        self.logger.info("запускаю comment_stats")
 
-        for groups_chunk in groups_chunks:
-            self.run_comment_instance(groups_chunk)
+        await self.run_workers(
+            "scripts/comment_stats.py", groups_list, env_vars, self.process_records
+        )
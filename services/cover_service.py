@@ -1,12 +1,18 @@
-import os
+import asyncio
+import datetime
 
 from nng_sdk.one_password.op_connect import OpConnect
 from nng_sdk.postgres.nng_postgres import NngPostgres
 
+from helpers.schedule import Schedule
 from services.scraper_service import ScraperService
 
 
 class CoverService(ScraperService):
+    schedule = Schedule(
+        interval=datetime.timedelta(days=7), jitter=datetime.timedelta(hours=6)
+    )
+
     postgres: NngPostgres
     op: OpConnect
 
@@ -15,61 +21,14 @@ def __init__(self, postgres: NngPostgres, op: OpConnect):
         self.postgres = postgres
         self.op = op
 
-    def run_cover_instance(self, groups: list[str]):
-        command = [
-            "browserstack-sdk",
-            "scripts/cover.py",
-            "--browserstack.config",
-            "browserstack.yml",
-        ]
-
-        session_name = self.generate_session_name()
-        self.logger.info(f"запускаю сессию {session_name}")
-
-        stringified_groups = ",".join(groups)
-        env_vars = {
-            "GROUPS": stringified_groups,
-            "SESSION_NAME": session_name,
-        }
-
-        for key, value in env_vars.items():
-            os.environ[key] = value
-
-        os.system(" ".join(command))
-
-    def run_covers(self):
-        user = self.op.get_scraper_user()
-        self.logger.info("получил сервисную страницу для скрапа")
-
-        groups_list = [str(i.group_id) for i in self.postgres.groups.get_all_groups()]
+    async def run_covers(self):
+        groups = await asyncio.to_thread(self.postgres.groups.get_all_groups)
+        groups_list = [str(i.group_id) for i in groups]
 
         self.logger.info(f"всего групп: {len(groups_list)}")
-        session_name = self.generate_session_name()
-        self.logger.info(f"айди сессии: {session_name}")
-
-        browserstack_credentials = self.op.get_browserstack_credentials()
-
-        env_vars = {
-            "VK_OTP": user.totp,
-            "VK_USERNAME": user.phone,
-            "VK_PASSWORD": user.password,
-            "BROWSERSTACK_USERNAME": browserstack_credentials.login,
-            "BROWSERSTACK_ACCESS_KEY": browserstack_credentials.api_key,
-            "BROWSERSTACK_BUILD_NAME": "cover",
-        }
 
-        for key, value in env_vars.items():
-            os.environ[key] = value
+        env_vars = await self.get_script_env()
 
         self.logger.info("запускаю cover")
 
-        groups_in_chunk = 20
-        groups_chunks = [
-            groups_list[i : i + groups_in_chunk]
-            for i in range(0, len(groups_list), groups_in_chunk)
-        ]
-
-        self.logger.info(f"всего сессий: {len(groups_chunks)}")
-
-        for groups_chunk in groups_chunks:
-            self.run_cover_instance(groups_chunk)
+        await self.run_workers("scripts/cover.py", groups_list, env_vars)
@@ -0,0 +1,88 @@
+import asyncio
+import datetime
+
+from nng_sdk.one_password.op_connect import OpConnect
+from nng_sdk.postgres.nng_postgres import NngPostgres
+
+from helpers.state_store import StateStore
+from services.scraper_service import ScraperService
+
+
+# совмещенный режим: одна сессия за одно посещение группы выполняет задачи
+# нескольких сервисов, а результаты отдаются в обработку каждому сервису
+class GroupsService(ScraperService):
+    default_item_cost = 400
+
+    postgres: NngPostgres
+    op: OpConnect
+    services: dict[str, ScraperService]
+    task_runs: StateStore
+
+    def __init__(
+        self, postgres: NngPostgres, op: OpConnect, services: list[ScraperService]
+    ):
+        super().__init__("groups")
+        self.postgres = postgres
+        self.op = op
+        self.services = {i.name: i for i in services}
+        self.task_runs = StateStore(self.path + "task_runs.json")
+
+        # запускаемся так же часто, как самый частый из сервисов, а задачи
+        # остальных добавляются в прогон, когда у них подходит срок
+        self.schedule = min((i.schedule for i in services), key=lambda i: i.interval)
+
+    def get_due_tasks(self, now: datetime.datetime) -> list[str]:
+        task_runs = self.task_runs.load()
+        due = []
+
+        for name, service in self.services.items():
+            last_run = task_runs.get(name)
+            if (
+                not last_run
+                or datetime.datetime.fromisoformat(last_run) + service.schedule.interval
+                <= now
+            ):
+                due.append(name)
+
+        return due
+
+    def save_task_runs(self, tasks: list[str], moment: datetime.datetime):
+        task_runs = self.task_runs.load()
+        task_runs.update({i: moment.isoformat() for i in tasks})
+        self.task_runs.save(task_runs)
+
+    def process_records(self, records: list[dict]):
+        tasks = {task for record in records for task in record["result"]}
+
+        for task in tasks:
+            self.services[task].process_records(
+                [
+                    {**record, "result": record["result"][task]}
+                    for record in records
+                    if task in record["result"]
+                ]
+            )
+
+    async def run_groups(self):
+        started_at = datetime.datetime.now()
+        tasks = self.get_due_tasks(started_at)
+        if not tasks:
+            self.logger.info("нет задач, у которых подошел срок")
+            return
+
+        groups = await asyncio.to_thread(self.postgres.groups.get_all_groups)
+        groups_list = [str(i.group_id) for i in groups]
+
+        self.logger.info(f"всего групп: {len(groups_list)}, задачи: {tasks}")
+
+        env_vars = {**await self.get_script_env(), "FUSED_TASKS": ",".join(tasks)}
+        if "comments" in self.services:
+            env_vars["WATERMARKS_PATH"] = self.services["comments"].watermarks.path
+
+        self.logger.info("запускаю groups")
+
+        await self.run_workers(
+            "scripts/groups.py", groups_list, env_vars, self.process_records
+        )
+
+        self.save_task_runs(tasks, started_at)
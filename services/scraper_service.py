@@ -1,39 +1,365 @@
-import json
+import asyncio
+import datetime
 import os
 import random
 from pathlib import Path
+from typing import Callable, Optional
 
-from typing import Any
+import sentry_sdk
 from nng_sdk.logger import get_logger
+from nng_sdk.one_password.op_connect import OpConnect
+
+from helpers import metrics
+from helpers.rate_governor import GovernorStore, RateGovernor
+from helpers.result_stream import ResultStream
+from helpers.run_checkpoint import RunCheckpoint
+from helpers.scraper_accounts import (
+    PRIMARY_ACCOUNT,
+    ScraperAccount,
+    get_governor_key,
+    load_extra_accounts,
+    partition,
+)
+from helpers.schedule import Schedule
+from helpers.script_runner import ScriptRunner, ScriptResult
+from helpers.work_planner import WorkPlanner
+from helpers.work_queue import WorkQueue
 
 
 class ScraperService:
     logger = get_logger()
 
+    # общий для всех сервисов раннер, ограничивает число сессий browserstack
+    runner = ScriptRunner()
+
+    schedule = Schedule(
+        interval=datetime.timedelta(days=1), jitter=datetime.timedelta(hours=1)
+    )
+
+    session_timeout: Optional[float] = 12 * 60 * 60
+
+    # адрес FloodCoordinator: через него сессии делят лимиты аккаунта
+    coordinator_address: Optional[str] = None
+
+    # json со списком дополнительных аккаунтов; элементы делятся между всеми
+    # аккаунтами, у каждого свой пул сессий и свои лимиты
+    accounts_path: Optional[str] = None
+
+    # browserstack или local (пул headless хромов на хосте)
+    driver_backend: str = "browserstack"
+
+    # воркеров запускается столько, чтобы на каждого пришлось около
+    # session_duration секунд работы; default_item_cost используется, пока
+    # время элементов еще не измерено
+    session_duration: float = 15 * 60
+    default_item_cost: float = 45
+
+    # необработанные элементы перезапускаются отдельным проходом; элемент,
+    # не обработанный за max_item_attempts проходов, пропускается
+    retry_passes: int = 1
+    max_item_attempts: int = 3
+
+    # запуски сессий аккаунта разносятся во времени по выученному интервалу:
+    # он сокращается, пока сессии завершаются успешно, и растет после падений
+    governed_launches: bool = False
+
     name: str
     path: str
+    planner: WorkPlanner
+    checkpoint: RunCheckpoint
+    governors: GovernorStore
+    launch_governors: dict[str, RateGovernor]
+    op: OpConnect
+    session_limit: int
+    account_sessions: dict[str, asyncio.Semaphore]
 
     def __init__(self, name: str):
         self.name = name
 
         self.path = f"scripts_results/{self.name}/"
+        self.set_session_limit(1)
         self._make_folders()
+        self.planner = WorkPlanner(
+            self.path + "costs.json", self.default_item_cost, self.session_duration
+        )
+        self.checkpoint = RunCheckpoint(self.path + "checkpoint.json")
+        self.governors = GovernorStore(self.path + "governor.json")
+        self.launch_governors = {}
 
     def _make_folders(self):
         if not os.path.exists(self.path):
             os.makedirs(self.path)
 
+    def set_session_limit(self, limit: int):
+        # лимит действует на каждый аккаунт отдельно
+        self.session_limit = limit
+        self.account_sessions = {}
+
+    def get_sessions(self, account: str) -> asyncio.Semaphore:
+        if account not in self.account_sessions:
+            self.account_sessions[account] = asyncio.Semaphore(self.session_limit)
+
+        return self.account_sessions[account]
+
+    def get_launch_governor(self, account: str) -> Optional[RateGovernor]:
+        if not self.governed_launches:
+            return None
+
+        if account not in self.launch_governors:
+            self.launch_governors[account] = RateGovernor(
+                "session_start",
+                self.governors,
+                key=get_governor_key("session_start", account),
+            )
+
+        return self.launch_governors[account]
+
+    def set_driver_backend(self, backend: str):
+        if backend not in ScriptRunner.BACKENDS:
+            raise ValueError(f"unknown driver backend {backend}")
+
+        self.driver_backend = backend
+
+    async def get_primary_account(self) -> ScraperAccount:
+        user = await asyncio.to_thread(self.op.get_scraper_user)
+        self.logger.info("получил сервисную страницу для скрапа")
+
+        return ScraperAccount(PRIMARY_ACCOUNT, user.phone, user.password, user.totp)
+
+    async def get_accounts(self) -> list[ScraperAccount]:
+        extra = await asyncio.to_thread(load_extra_accounts, self.accounts_path)
+        return [await self.get_primary_account(), *extra]
+
+    async def get_script_env(self) -> dict[str, str]:
+        account = await self.get_primary_account()
+
+        browserstack_credentials = await asyncio.to_thread(
+            self.op.get_browserstack_credentials
+        )
+
+        env_vars = {
+            **account.to_env(),
+            "BROWSERSTACK_USERNAME": browserstack_credentials.login,
+            "BROWSERSTACK_ACCESS_KEY": browserstack_credentials.api_key,
+            "BROWSERSTACK_BUILD_NAME": self.name,
+            "GOVERNOR_PATH": self.governors.state.path,
+        }
+
+        if self.coordinator_address:
+            env_vars["COORDINATOR_ADDRESS"] = self.coordinator_address
+
+        return env_vars
+
+    def process_records(self, records: list[dict]):
+        # сервисы, которым нужны результаты скриптов, переопределяют этот метод
+        pass
+
+    async def launch_script(
+        self,
+        script: str,
+        env_vars: dict[str, str],
+        session_name: str,
+        on_records: Optional[Callable[[list[dict]], None]] = None,
+        account: str = PRIMARY_ACCOUNT,
+    ) -> ScriptResult:
+        log_path = f"{self.path}logs/{session_name}.log"
+        stream = ResultStream(self.get_session_path(session_name))
+        finished = asyncio.Event()
+        ingest_failed = False
+
+        async def ingest(records: list[dict]):
+            nonlocal ingest_failed
+
+            # замеры скрипта идут в метрики, остальное в обработку сервиса
+            for record in records:
+                if "timing" in record:
+                    metrics.observe_script_timing(
+                        self.name, record["timing"], record["seconds"]
+                    )
+
+            records = [record for record in records if "timing" not in record]
+            if not on_records or not records:
+                return
+
+            try:
+                await asyncio.to_thread(on_records, records)
+            except Exception as e:
+                ingest_failed = True
+                sentry_sdk.capture_exception(e)
+                self.logger.error(f"ошибка при обработке сессии {session_name}: {e}")
+
+        # результаты обрабатываются по мере того, как скрипт их пишет
+        follower = asyncio.create_task(stream.follow(finished, ingest))
+
+        try:
+            async with self.get_sessions(account):
+                result = await self.runner.run(
+                    script,
+                    {**env_vars, "SESSION_NAME": session_name},
+                    session_name,
+                    log_path,
+                    self.session_timeout,
+                    self.driver_backend,
+                )
+        finally:
+            finished.set()
+            await follower
+
+        metrics.SESSION_SECONDS.labels(
+            self.name, "ok" if result.ok else "failed"
+        ).observe(result.duration)
+
+        if not ingest_failed:
+            self.cleanup(session_name)
+
+        if result.ok:
+            Path(log_path).unlink(missing_ok=True)
+        else:
+            self.logger.error(
+                f"сессия {session_name} завершилась с кодом {result.return_code}, "
+                f"лог: {log_path}\n" + "\n".join(result.stderr_tail)
+            )
+
+        return result
+
+    async def _run_worker(
+        self,
+        queue: WorkQueue,
+        script: str,
+        env_vars: dict[str, str],
+        on_records: Optional[Callable[[list[dict]], None]],
+        account: str,
+    ):
+        launch_governor = self.get_launch_governor(account)
+
+        while queue.remaining():
+            if launch_governor:
+                await asyncio.sleep(launch_governor.reserve())
+
+            session_name = self.generate_session_name()
+            self.logger.info(f"запускаю воркер {session_name} ({account})")
+
+            result = await self.launch_script(
+                script,
+                {**env_vars, "QUEUE_ADDRESS": queue.address},
+                session_name,
+                on_records,
+                account,
+            )
+
+            if launch_governor:
+                if result.ok:
+                    launch_governor.success()
+                else:
+                    launch_governor.backoff()
+
+            queue.release(session_name)
+
+            if not queue.handed_out_to(session_name):
+                self.logger.error(f"воркер {session_name} не взял ни одного элемента")
+                return
+
+    async def _run_shard(
+        self,
+        script: str,
+        items: list[str],
+        env_vars: dict[str, str],
+        on_records: Callable[[list[dict]], None],
+        account: str,
+    ):
+        # каждый воркер логинится один раз и берет элементы из общей очереди,
+        # пока она не опустеет; упавший воркер заменяется новым
+        workers_count = min(
+            self.session_limit, len(items), self.planner.sessions_needed(items)
+        )
+        self.logger.info(
+            f"{account}: элементов: {len(items)}, воркеров: {workers_count}"
+        )
+
+        with WorkQueue(self.planner.order(items), self.planner.record) as queue:
+            await asyncio.gather(
+                *(
+                    self._run_worker(queue, script, env_vars, on_records, account)
+                    for _ in range(workers_count)
+                )
+            )
+
+        if queue.failed:
+            self.logger.error(f"{account}: не удалось обработать: {queue.failed}")
+
+    async def _run_pass(
+        self,
+        script: str,
+        items: list[str],
+        env_vars: dict[str, str],
+        on_records: Callable[[list[dict]], None],
+        accounts: list[ScraperAccount],
+    ):
+        # элементы делятся между аккаунтами, у каждого своя очередь и воркеры
+        shards = partition(items, [i.name for i in accounts])
+
+        await asyncio.gather(
+            *(
+                self._run_shard(
+                    script,
+                    shards[account.name],
+                    {**env_vars, **account.to_env()},
+                    on_records,
+                    account.name,
+                )
+                for account in accounts
+                if shards[account.name]
+            )
+        )
+
+    async def run_workers(
+        self,
+        script: str,
+        items: list[str],
+        env_vars: dict[str, str],
+        on_records: Optional[Callable[[list[dict]], None]] = None,
+    ):
+        if self.checkpoint.resume_or_start(items, self.schedule.interval):
+            self.logger.info("продолжаю прерванный прогон")
+
+        def ingest(records: list[dict]):
+            if on_records:
+                on_records(records)
+
+            # элемент считается обработанным, только когда принят его итоговый
+            # результат; промежуточные части помечены partial
+            finished = [
+                record["item"] for record in records if not record.get("partial")
+            ]
+            self.checkpoint.complete(finished)
+            metrics.ITEMS_PROCESSED.labels(self.name).inc(len(finished))
+
+        accounts = await self.get_accounts()
+        if len(accounts) > 1:
+            self.logger.info(f"аккаунтов: {len(accounts)}")
+
+        items = self.checkpoint.pending
+        for attempt in range(self.retry_passes + 1):
+            if not items:
+                break
+
+            if attempt:
+                self.logger.info(f"повторный проход, элементов: {len(items)}")
+
+            await self._run_pass(script, items, env_vars, ingest, accounts)
+            self.planner.save()
+            items = self.checkpoint.fail_pending(self.max_item_attempts)
+
+        if items:
+            self.logger.error(f"остались необработанными: {items}")
+
     @staticmethod
     def generate_session_name() -> str:
         symbols = "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ1234567890"
         return "".join(random.choice(symbols) for _ in range(30))
 
     def get_session_path(self, session_id: str) -> str:
-        return self.path + session_id + ".json"
-
-    def save_result(self, session_id: str, result: Any):
-        with open(self.get_session_path(session_id), "w", encoding="utf8") as f:
-            json.dump(result.to_dict(), f, indent=4, ensure_ascii=False)
+        return self.path + session_id + ".jsonl"
 
     def cleanup(self, session_id: str):
         file = Path(self.get_session_path(session_id))
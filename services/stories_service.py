@@ -1,16 +1,21 @@
+import asyncio
 import datetime
-import json
-import os
 
 from nng_sdk.one_password.op_connect import OpConnect
 from nng_sdk.postgres.nng_postgres import NngPostgres
 from nng_sdk.pydantic_models.user import Violation, ViolationType, BanPriority
 from vk_api.vk_api import VkApiMethod
 
+from helpers import metrics
+from helpers.schedule import Schedule
 from services.scraper_service import ScraperService
 
 
 class StoriesService(ScraperService):
+    schedule = Schedule(
+        interval=datetime.timedelta(hours=6), jitter=datetime.timedelta(minutes=30)
+    )
+
     postgres: NngPostgres
     op: OpConnect
     vk: VkApiMethod
@@ -30,10 +35,6 @@ def reformat_link(link: str) -> str:
         else:
             return link
 
-    def get_stories_execution_result(self, session_id: str) -> dict[int, list[str]]:
-        with open(self.get_session_path(session_id), "r", encoding="utf-8") as f:
-            return json.load(f)
-
     def resolve_users(self, data: dict[int, list[str]]) -> dict[int, list[int]]:
         if not data.keys():
             return {}
@@ -81,81 +82,39 @@ def give_warnings_or_ban(self, user_id: int, group_id: int):
         # если меньше двух нарушений
         if user.violations and len(active_warnings) < 3:
             self.logger.info(f"выдал предупреждение {user_id} в {group_id}")
-            self.postgres.users.add_violation(user_id, new_violation)
         else:
             self.logger.info(
                 f"выдал бан {user_id} в {group_id} ибо у него уже {len(active_warnings)} предупреждений"
             )
             new_violation.type = ViolationType.banned
             new_violation.active = True
-            self.postgres.users.add_violation(user_id, new_violation)
-
-    def run_stories_instance(self, groups: list[str]):
-        command = [
-            "browserstack-sdk",
-            "scripts/stories.py",
-            "--browserstack.config",
-            "browserstack.yml",
-        ]
-
-        session_name = self.generate_session_name()
-        self.logger.info(f"запускаю сессию {session_name}")
-
-        stringified_groups = ",".join(groups)
-        env_vars = {
-            "GROUPS": stringified_groups,
-            "SESSION_NAME": session_name,
-        }
 
-        for key, value in env_vars.items():
-            os.environ[key] = value
+        with metrics.DB_WRITE_SECONDS.labels(self.name).time():
+            self.postgres.users.add_violation(user_id, new_violation)
 
-        os.system(" ".join(command))
+        metrics.VIOLATIONS_ISSUED.labels(self.name, new_violation.type.name).inc()
 
-        result = self.get_stories_execution_result(session_name)
+    def process_records(self, records: list[dict]):
+        result = {int(i["item"]): i["result"] for i in records if i["result"]}
         resolved: dict[int, list[int]] = self.resolve_users(result)
 
         if not resolved:
-            self.logger.info("нет нарушителей за сессию")
             return
 
         for group_id, user_ids in resolved.items():
             for user_id in user_ids:
                 self.give_warnings_or_ban(user_id, group_id)
 
-    def run_stories(self):
-        user = self.op.get_scraper_user()
-        self.logger.info("получил сервисную страницу для скрапа")
-
-        groups_list = [str(i.group_id) for i in self.postgres.groups.get_all_groups()]
+    async def run_stories(self):
+        groups = await asyncio.to_thread(self.postgres.groups.get_all_groups)
+        groups_list = [str(i.group_id) for i in groups]
 
         self.logger.info(f"всего групп: {len(groups_list)}")
-        session_name = self.generate_session_name()
-        self.logger.info(f"айди сессии: {session_name}")
-
-        browserstack_credentials = self.op.get_browserstack_credentials()
-
-        env_vars = {
-            "VK_OTP": user.totp,
-            "VK_USERNAME": user.phone,
-            "VK_PASSWORD": user.password,
-            "BROWSERSTACK_USERNAME": browserstack_credentials.login,
-            "BROWSERSTACK_ACCESS_KEY": browserstack_credentials.api_key,
-            "BROWSERSTACK_BUILD_NAME": "stories",
-        }
 
-        for key, value in env_vars.items():
-            os.environ[key] = value
+        env_vars = await self.get_script_env()
 
         self.logger.info("запускаю stories")
 
-        groups_in_chunk = 20
-        groups_chunks = [
-            groups_list[i : i + groups_in_chunk]
-            for i in range(0, len(groups_list), groups_in_chunk)
-        ]
-
-        self.logger.info(f"всего сессий: {len(groups_chunks)}")
-
-        for groups_chunk in groups_chunks:
-            self.run_stories_instance(groups_chunk)
+        await self.run_workers(
+            "scripts/stories.py", groups_list, env_vars, self.process_records
+        )